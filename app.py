@@ -1,16 +1,32 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, db
 from datetime import date
 import uuid
-import pandas as pd
-import json
 import time
+import os
+import functools
+import json
+import concurrent.futures
 import streamlit.components.v1 as components # Import components
+import storage
+from writeback import WriteBehindQueue
+from replica import TaskReplica
+import catalog
+import bitset
+from taskstore import TaskStore, edit_task, edit_changes
+import dataio
+from offline import OfflineBackend
+from dbclient import DatabaseClient, NotConfirmed
+import partitions
+from metrics import Metrics, InstrumentedBackend, MetricsExporter
 
 # --- CONFIGURATION (using Streamlit Secrets) ---
-DATABASE_URL = st.secrets["firebase"]["database_url"]
-DB_PATH = "tasks"
+PARTITION_CACHE_ENTRIES = 200 # Users whose task replica and catalog a server process keeps in memory at once
+WRITE_BEHIND_DELAY_SECS = 1.0 # Checkbox toggles are batched and flushed after this pause
+LIVE_SYNC_INTERVAL_SECS = 3 # How often a page checks the replica for other devices' changes and redraws the save status
+REPLICA_REVALIDATE_SECS = 60 # Without a live listener, revalidate the replica's ETag this often (a 304 when unchanged)
+TASKS_PER_PAGE = 20 # Task cards rendered per page of the task list
+POMODORO_FINISH_TOLERANCE_SECS = 2 # A browser may report the end of a phase this much ahead of the server's clock
+BULK_DELETE_CHUNK_TASKS = 25 # Tasks per multi-path update when deleting several chapters; chunks are sent in parallel
 
 # --- AUDIO ASSETS (URLs) ---
 # Using reliable free sound sources. Replace with your own if you prefer.
@@ -20,32 +36,53 @@ WHITE_NOISE_URL = "https://www.soundjay.com/nature/sounds/whitenoise-1.mp3" # Lo
 
 
 # --- FIREBASE INITIALIZATION ---
+@st.cache_resource # Once per process, not per session
 def initialize_firebase():
-    if not firebase_admin._apps:
-        try:
-            # Attempt to parse private_key correctly if it contains newlines
-            firebase_private_key = st.secrets["firebase"]["private_key"].replace('\\n', '\n')
-
-            firebase_creds = {
-                "type": st.secrets["firebase"]["type"],
-                "project_id": st.secrets["firebase"]["project_id"],
-                "private_key_id": st.secrets["firebase"]["private_key_id"],
-                "private_key": firebase_private_key, # Use the modified private_key
-                "client_email": st.secrets["firebase"]["client_email"],
-                "client_id": st.secrets["firebase"]["client_id"],
-                "auth_uri": st.secrets["firebase"]["auth_uri"],
-                "token_uri": st.secrets["firebase"]["token_uri"],
-                "auth_provider_x509_cert_url": st.secrets["firebase"]["auth_provider_x509_cert_url"],
-                "client_x509_cert_url": st.secrets["firebase"]["client_x509_cert_url"],
-                "universe_domain": st.secrets["firebase"]["universe_domain"],
-            }
-            cred = credentials.Certificate(firebase_creds)
-            firebase_admin.initialize_app(cred, {"databaseURL": DATABASE_URL})
-        except Exception as e:
-            st.error(f"Error initializing Firebase. Check your `.streamlit/secrets.toml` and network connection. Ensure private_key is correctly formatted. Error: {e}", icon="❌")
-            st.stop()
-
-initialize_firebase()
+    try:
+        storage.initialize_firebase_app(st.secrets["firebase"], http_timeout=st.secrets.get("storage", {}).get("db_timeout", 15))
+    except Exception as e:
+        st.error(f"Error initializing Firebase. Check your `.streamlit/secrets.toml` and network connection. Ensure private_key is correctly formatted. Error: {e}", icon="❌")
+        st.stop()
+
+# --- METRICS ---
+@st.cache_resource
+def get_metrics():
+    # Timings and counters for this server process; with [metrics] export_path set they are also written to a file.
+    metrics_config = st.secrets.get("metrics", {})
+    metrics = Metrics()
+    if metrics_config.get("export_path"):
+        MetricsExporter(
+            metrics, metrics_config["export_path"], metrics_config.get("export_format", "jsonl"),
+            interval=metrics_config.get("export_interval", 60), max_bytes=metrics_config.get("max_bytes", 5_000_000),
+            backups=metrics_config.get("backups", 3),
+        )
+    return metrics
+
+def timed(func):
+    # Records every call (fragment-only reruns included) as a span named after the function.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with get_metrics().span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+@st.cache_resource
+def get_storage():
+    # The [storage] table in secrets.toml selects the backend; Firebase stays the default.
+    storage_config = st.secrets.get("storage", {})
+    if storage_config.get("backend", "firebase") == "firebase":
+        initialize_firebase()
+    backend = storage.create_backend(storage_config)
+    if st.secrets.get("metrics"):
+        # Times each database call and counts the bytes moved; only wrapped when [metrics] is configured.
+        backend = InstrumentedBackend(backend, get_metrics())
+    # Every call runs on a bounded pool with a deadline and retries transient failures; submit() hands out futures.
+    backend = DatabaseClient(backend, max_workers=storage_config.get("db_workers", 4), timeout=storage_config.get("db_timeout", 15), retries=storage_config.get("db_retries", 3))
+    if storage_config.get("offline_cache"):
+        # Reads come from an on-disk snapshot and writes are queued, so startup never waits on the database.
+        # Each user's partition is added to the synced paths when a session first opens it.
+        backend = OfflineBackend(backend, storage_config["offline_cache"], [], sync_interval=storage_config.get("sync_interval", 30))
+    return backend
 
 # --- AUDIO PLAYBACK FUNCTION ---
 def play_sound(sound_url: str, unique_key: str):
@@ -63,61 +100,305 @@ def play_sound(sound_url: str, unique_key: str):
     components.html(audio_html, height=0)
 
 
-# --- FIREBASE DATA OPERATIONS ---
-@st.cache_data(ttl=300, show_spinner="Loading your study tasks...")
-def load_tasks():
+# --- USER PARTITIONS ---
+# Every user's data lives under users/<uid>/ (see partitions.py); a session only reads its own user's partition.
+def current_user():
+    return st.session_state.user_id
+
+def tasks_path():
+    return partitions.tasks_path(current_user())
+
+def catalog_path():
+    return partitions.catalog_path(current_user())
+
+# --- DATA OPERATIONS ---
+@st.cache_resource(max_entries=PARTITION_CACHE_ENTRIES, on_release=TaskReplica.stop_listening)
+def get_user_replica(uid):
+    # One copy of each user's task tree per server process; writes are applied to it in place instead of clearing it.
+    # With `live = true` (the default) it follows the database's change stream; otherwise it revalidates by ETag.
+    # Without the listener, `lazy_subjects = true` (the default) fetches each subject on first view via an indexed query,
+    # and afterwards re-queries a subject only when its entry in the user's catalog changed.
+    # Users idle long enough to fall out of the cache have their listener closed.
+    storage_config = st.secrets.get("storage", {})
+    if isinstance(get_storage(), OfflineBackend):
+        get_storage().track(partitions.user_root(uid))
+    replica = TaskReplica(get_storage(), partitions.tasks_path(uid), ttl=REPLICA_REVALIDATE_SECS, lazy_subjects=storage_config.get("lazy_subjects", True), catalog_path=partitions.catalog_path(uid))
+    if storage_config.get("live", True):
+        replica.start_listening()
+    return replica
+
+@st.cache_resource(max_entries=PARTITION_CACHE_ENTRIES, on_release=TaskReplica.stop_listening)
+def get_user_catalog(uid):
+    # A user's per-subject counters node is tiny, so the process keeps all of it.
+    path = partitions.catalog_path(uid)
+    subject_catalog = TaskReplica(get_storage(), path, ttl=REPLICA_REVALIDATE_SECS)
+    if st.secrets.get("storage", {}).get("live", True):
+        subject_catalog.start_listening()
+    stored = subject_catalog.snapshot()
+    if not stored or not catalog.is_current(stored):
+        # First run against a partition without a catalog, or with one from before the s_ keys: build it once from the user's tasks.
+        built = catalog.build_catalog(get_storage().get(partitions.tasks_path(uid)))
+        if built or stored:
+            get_storage().set(path, built)
+            subject_catalog.apply({path: built})
+    return subject_catalog
+
+def get_replica():
+    return get_user_replica(current_user())
+
+def get_catalog():
+    return get_user_catalog(current_user())
+
+def catalog_subjects():
+    # Subject name -> {"tasks", "done", "total"} counters, read from the catalog instead of the tasks.
+    return catalog.subjects_in(get_catalog().snapshot())
+
+def apply_to_replicas(values, uid=None):
+    # Pass uid when calling from outside the script thread (the write-behind queue's flush).
+    uid = uid or current_user()
+    get_user_replica(uid).apply(values)
+    get_user_catalog(uid).apply(values)
+
+@timed
+def load_tasks(subjects):
+    # Only the given subjects are loaded into the session; subjects the process has not seen yet are fetched by query.
     try:
-        ref = db.reference(DB_PATH)
-        data = ref.get()
-        if not data:
-            return [], [], [], set()
-
-        tasks_list = []
-        checks_list = []
-        keys_list = []
-        subjects_set = set()
-
-        for key, value in data.items():
-            task = value.get("task", {})
-            check = value.get("check", {})
-            tasks_list.append(task)
-            checks_list.append(check)
-            keys_list.append(key)
-            if "Subject" in task:
-                subjects_set.add(task["Subject"])
-
-        return tasks_list, checks_list, keys_list, subjects_set
+        cached = all(get_replica().has_subject(subject) for subject in subjects) and not get_replica().is_stale
+        get_metrics().inc("load_tasks_cache_hits" if cached else "load_tasks_cache_misses")
+        with st.spinner("Loading your study tasks..."):
+            if get_replica().is_stale:
+                get_replica().refresh()
+            records = {}
+            for subject in subjects:
+                records.update(get_replica().subject_snapshot(subject))
+            subjects_set = set(catalog_subjects())
+        return records, subjects_set
     except Exception as e:
-        st.error(f"Error loading tasks from Firebase: {e}", icon="❌")
-        return [], [], [], set()
-
-def save_task(task, check, key=None):
+        st.error(f"Error loading tasks from the database: {e}", icon="❌")
+        return {}, set()
+
+def apply_if_written(values, future, uid=None):
+    # Done callback of a write that outlived db_timeout; runs on a pool thread, so uid must be passed.
+    if future.exception() is None:
+        apply_to_replicas(values, uid=uid)
+
+def send_update(values, key, change, failure):
+    # Sends one multi-path update for task `key`. Returns True once written, False if it failed and None if the
+    # database has not confirmed it yet. An unconfirmed write may still land, so it is never sent again: the
+    # session keeps its future per task, and a retry waits on that instead.
+    unconfirmed = st.session_state.setdefault("unconfirmed_writes", {}) # task key -> (change, future)
+    if key in unconfirmed:
+        earlier, future = unconfirmed[key]
+        if not future.done():
+            st.warning("An earlier change to this chapter has not been confirmed by the database yet; it was not sent again.", icon="⏳")
+            return None
+        del unconfirmed[key]
+        if future.exception() is None:
+            if earlier == change:
+                return True
+            # Another change landed meanwhile, so what this one was computed from is out of date.
+            pull_replica_changes()
+            st.warning("An earlier change to this chapter was saved after all. Check the chapter and try again.", icon="⚠️")
+            return None
     try:
-        ref = db.reference(DB_PATH)
-        if not key:
-            key = str(uuid.uuid4())
-        ref.child(key).set({"task": task, "check": check})
-        return key
-    except Exception as e:
-        st.error(f"Error saving task to Firebase: {e}", icon="❌")
+        get_storage().update(values)
+    except NotConfirmed as e:
+        unconfirmed[key] = (change, e.future)
+        e.future.add_done_callback(functools.partial(apply_if_written, values, uid=current_user()))
+        st.warning(f"{e} Saving again will not repeat it.", icon="⏳")
         return None
-
-def delete_task_from_db(key):
-    try:
-        db.reference(DB_PATH).child(key).delete()
-        return True
     except Exception as e:
-        st.error(f"Error deleting task from Firebase: {e}", icon="❌")
+        st.error(f"{failure}: {e}", icon="❌")
         return False
+    apply_to_replicas(values)
+    return True
+
+@timed
+def save_task(task, check, key=None):
+    # Writes a new (or restored) task together with its subject's catalog counters; checks are stored encoded.
+    # Returns the key, None while the database has not confirmed the write, or False if it failed.
+    check = bitset.encode_check(check, task)
+    change = json.dumps({"add": [task, check]}, sort_keys=True, default=str)
+    if not key:
+        # Adding the same task again after an unconfirmed attempt reuses its key, so it cannot be added twice.
+        unconfirmed = st.session_state.get("unconfirmed_writes", {})
+        key = next((k for k, (earlier, _) in unconfirmed.items() if earlier == change), None) or str(uuid.uuid4())
+    values = {f"{tasks_path()}/{key}": {"task": task, "check": check}, **catalog.task_changes(task, check, 1, catalog_path())}
+    written = send_update(values, key, change, "Error saving task to the database")
+    return key if written else written
+
+def get_write_queue():
+    if "write_queue" not in st.session_state:
+        st.session_state.write_queue = WriteBehindQueue(get_storage(), delay=WRITE_BEHIND_DELAY_SECS, on_flush=functools.partial(apply_to_replicas, uid=current_user()), timeout=st.secrets.get("storage", {}).get("db_timeout", 15))
+    return st.session_state.write_queue
+
+def save_check(key, subject, kind, index, state, length):
+    # Queues one item's tick; the write-behind queue sets it inside tasks/<key>/check/<kind> ("b1:...") with a
+    # transaction, so ticks saved meanwhile by other sessions survive, and moves the done counter by what changed.
+    path = catalog_path()
+    get_write_queue().record_tick(
+        f"{tasks_path()}/{key}/check/{kind}", index, state, previous=not state, length=length,
+        counters=lambda done_delta: catalog.counter_changes(subject, done=done_delta, catalog_path=path),
+    )
+
+def flush_pending_writes():
+    # Called before edits, deletes and exports so they never race queued checkbox writes.
+    if get_write_queue().flush():
+        return True
+    st.error(f"Error saving progress to the database: {get_write_queue().last_error}", icon="❌")
+    return False
+
+@timed
+def update_task_fields(key, changes, counter_changes=None, change=None):
+    # Sends only the changed fields, e.g. {"task/Chapter": ..., "check/SN": "b1:..."}, plus any catalog counter changes, as one multi-path update.
+    # `change` identifies the edit across retries (the changed paths can differ, e.g. new item IDs). Returns True, False or None, as send_update.
+    if not changes:
+        return True
+    values = {f"{tasks_path()}/{key}/{path}": value for path, value in changes.items()}
+    values.update(counter_changes or {})
+    return send_update(values, key, json.dumps({"edit": change or changes}, sort_keys=True, default=str), "Error saving task to the database")
+
+@timed
+def delete_task_from_db(key, task, check):
+    values = {f"{tasks_path()}/{key}": None, **catalog.task_changes(task, check, -1, catalog_path())}
+    return send_update(values, key, json.dumps({"delete": key}), "Error deleting task from the database")
+
+@timed
+def delete_tasks_from_db(entries, on_chunk=None):
+    # Deletes (key, task, check) entries a chunk per multi-path update, chunks in parallel; returns the deleted keys and errors.
+    futures = {}
+    for chunk in dataio.chunks(entries, BULK_DELETE_CHUNK_TASKS):
+        values = {f"{tasks_path()}/{key}": None for key, _, _ in chunk}
+        values.update(catalog.merge_changes(*(catalog.task_changes(task, check, -1, catalog_path()) for _, task, check in chunk)))
+        futures[get_storage().submit("update", values)] = ([key for key, _, _ in chunk], values)
+    deleted, errors = [], []
+    for future in concurrent.futures.as_completed(futures):
+        keys, values = futures[future]
+        try:
+            future.result()
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        apply_to_replicas(values)
+        deleted += keys
+        if on_chunk:
+            on_chunk(len(deleted))
+    return deleted, errors
+
+# --- IN-MEMORY TASK MUTATIONS ---
+# Keep the session's task store in step with a write, so nothing has to be reloaded afterwards.
+def refresh_all_subjects():
+    # Subjects loaded into this session are known in full here; the catalog knows about the rest.
+    loaded = st.session_state.task_store.subjects()
+    st.session_state.all_subjects = loaded | (set(catalog_subjects()) - st.session_state.loaded_subjects)
+
+def upsert_local_task(key, task, check):
+    st.session_state.task_store.upsert(key, task, check)
+    refresh_all_subjects()
+
+def remove_local_task(key):
+    st.session_state.task_store.remove(key)
+    refresh_all_subjects()
 
 # --- SESSION STATE INITIALIZATION ---
-if "tasks" not in st.session_state:
-    st.session_state.tasks, st.session_state.task_checks, st.session_state.task_keys, loaded_subjects = load_tasks()
+rerun_trace = get_metrics().begin_rerun()
+
+USER_SCOPED_STATE = ("task_store", "write_queue", "unconfirmed_writes", "selected_view_subject", "last_deleted", "editing_task_key", "task_page", "bulk_delete_keys")
+USER_SCOPED_WIDGET_PREFIXES = ("sn_", "laq_", "show_items_", "show_confirm_")
+
+def resolve_user():
+    # ?user= in the URL picks the partition; otherwise the session keeps its user, starting from [storage] default_user.
+    requested = partitions.normalize_user(st.query_params.get("user"))
+    previous = st.session_state.get("user_id")
+    uid = requested or previous or partitions.normalize_user(st.secrets.get("storage", {}).get("default_user")) or partitions.DEFAULT_USER
+    if previous is not None and uid != previous:
+        # Switching users: land the old user's queued writes, then drop everything loaded for them.
+        if not flush_pending_writes():
+            st.query_params["user"] = previous
+            return
+        for state_key in [k for k in st.session_state.keys() if k in USER_SCOPED_STATE or k.startswith(USER_SCOPED_WIDGET_PREFIXES)]:
+            del st.session_state[state_key]
+    st.session_state.user_id = uid
+
+resolve_user()
+
+def sync_session_tasks(subjects):
+    # (Re)builds the session's task store for the given subjects from the in-memory replica.
+    st.session_state.replica_version = get_replica().version
+    st.session_state.loaded_subjects = set(subjects)
+    records, loaded_subjects = load_tasks(subjects)
+    st.session_state.task_store = TaskStore(records)
     st.session_state.all_subjects = loaded_subjects
 
     if not st.session_state.all_subjects:
         st.session_state.all_subjects.add("Anatomy") # Ensure at least one subject exists
 
+def current_replica_version():
+    # Revalidates the replica first when it is due (ETag mode); a live replica is always current.
+    try:
+        if get_replica().is_stale:
+            get_replica().refresh()
+    except Exception as e:
+        st.error(f"Error loading tasks from the database: {e}", icon="❌")
+    return get_replica().version
+
+def same_as_session(key, value):
+    # Whether the replica's value of a task is what the session already holds, e.g. after the session's own write.
+    store = st.session_state.task_store
+    if value is None or key not in store:
+        return value is None and key not in store
+    task, check = store.get(key)
+    stored_task = value.get("task", {})
+    return storage.stored_form(task) == stored_task and check == bitset.encode_check(value.get("check", {}), stored_task)
+
+def pull_replica_changes():
+    # Brings the session's store up to the replica: only tasks whose value differs from the session's copy are
+    # patched in, so the session's own writes change nothing. Returns True if anything shown may have changed.
+    version, keys = get_replica().changes_since(st.session_state.replica_version)
+    if keys is None:
+        for widget_key in [k for k in st.session_state.keys() if k.startswith(("sn_", "laq_"))]:
+            del st.session_state[widget_key]
+        sync_session_tasks(st.session_state.loaded_subjects)
+        return True
+    st.session_state.replica_version = version
+    store, patched = st.session_state.task_store, []
+    for key, value in get_replica().values(keys).items():
+        if same_as_session(key, value):
+            continue
+        if value is None:
+            store.remove(key)
+        elif key in store or value.get("task", {}).get("Subject") in st.session_state.loaded_subjects:
+            store.upsert(key, value.get("task", {}), value.get("check", {}))
+        else:
+            continue
+        patched.append(key)
+    if not patched:
+        return False
+    forget_check_widgets(patched)
+    refresh_all_subjects()
+    return True
+
+def forget_check_widgets(keys):
+    # Checkbox widgets keep their own state, so drop it for tasks changed elsewhere to show the new values.
+    prefixes = tuple(f"{kind}_{key}_" for key in keys for kind in ("sn", "laq"))
+    for widget_key in [k for k in st.session_state.keys() if k.startswith(prefixes)]:
+        del st.session_state[widget_key]
+
+def ensure_subject_loaded(subject):
+    # Subjects are loaded into the session the first time they are viewed and then kept.
+    if subject is None or subject in st.session_state.loaded_subjects:
+        return
+    records, _ = load_tasks([subject])
+    for key, value in records.items():
+        if key not in st.session_state.task_store: # Tasks added or moved here during this session are already present
+            st.session_state.task_store.upsert(key, value.get("task", {}), value.get("check", {}))
+    st.session_state.loaded_subjects.add(subject)
+
+if "task_store" not in st.session_state:
+    sync_session_tasks([st.query_params["subject"]] if "subject" in st.query_params else [])
+elif st.session_state.replica_version != current_replica_version() and not get_write_queue().pending_count:
+    pull_replica_changes() # Changes made on other devices
+
 # Logic to set/restore selected_view_subject using URL query parameters
 query_params = st.query_params
 
@@ -138,11 +419,16 @@ else:
         else:
             st.session_state.selected_view_subject = None
 
+ensure_subject_loaded(st.session_state.selected_view_subject)
+
 if "editing_task_key" not in st.session_state:
     st.session_state.editing_task_key = None
 if "temp_edit_task_data" not in st.session_state:
     st.session_state.temp_edit_task_data = {}
 
+if "task_page" not in st.session_state:
+    st.session_state.task_page = 0
+
 if "filter_start_date" not in st.session_state:
     st.session_state.filter_start_date = None
 if "filter_end_date" not in st.session_state:
@@ -190,12 +476,21 @@ def update_timer_duration_on_edit():
         st.session_state.pomodoro_time_left = st.session_state.pomodoro_long_break_mins * 60
     st.session_state.pomodoro_running = False
 
+def pomodoro_seconds_left():
+    # While running, pomodoro_time_left is as of pomodoro_last_update_time; the browser does the counting.
+    left = st.session_state.pomodoro_time_left
+    if st.session_state.pomodoro_running:
+        left -= time.time() - st.session_state.pomodoro_last_update_time
+    return max(left, 0)
+
 def start_pomodoro():
     st.session_state.pomodoro_running = True
     st.session_state.pomodoro_last_update_time = time.time()
 
 def pause_pomodoro():
+    st.session_state.pomodoro_time_left = pomodoro_seconds_left()
     st.session_state.pomodoro_running = False
+    st.session_state.pomodoro_last_update_time = time.time()
 
 def reset_pomodoro():
     st.session_state.pomodoro_running = False
@@ -219,9 +514,20 @@ def toggle_mode():
     st.session_state.pomodoro_running = False
     st.session_state.pomodoro_last_update_time = time.time()
 
-def format_time(seconds):
-    mins, secs = divmod(int(seconds), 60)
-    return f"{mins:02d}:{secs:02d}"
+def on_pomodoro_clock_event():
+    # The browser reports the end of a phase once; the token ties the report to the phase it timed.
+    event = st.session_state.get("pomodoro_clock") or {}
+    if (event.get("event") == "finished" and st.session_state.pomodoro_running
+            and event.get("token") == st.session_state.pomodoro_last_update_time
+            and pomodoro_seconds_left() <= POMODORO_FINISH_TOLERANCE_SECS):
+        st.session_state.play_pomodoro_finish_sound = True
+        st.session_state.pomodoro_finished_message = f"{st.session_state.pomodoro_mode.replace('_', ' ').title()} session finished!"
+        toggle_mode()
+
+@st.cache_resource
+def get_pomodoro_clock():
+    # Countdown that runs in the browser (frontend/pomodoro/index.html), so a running timer costs the server nothing.
+    return components.declare_component("pomodoro_clock", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "pomodoro"))
 
 # --- LAYOUT & THEME ---
 st.set_page_config("📚 Study Tracker", layout="wide", initial_sidebar_state="expanded")
@@ -255,12 +561,6 @@ body[data-theme="dark"] .css-1d391kg { background-color: rgba(17, 26, 34, 0.9);
     box-shadow: 0 4px 8px rgba(0, 0, 0, 0.3); margin-bottom: 20px; border: 1px solid #444;
 }
 body[data-theme="dark"] .pomodoro-container { background-color: #1a1a1a; border: 1px solid #333; box-shadow: 0 4px 10px rgba(0, 0, 0, 0.5); }
-.pomodoro-mode-text { font-size: 1.2em; color: #a0a0a0; margin-bottom: 5px; }
-.pomodoro-time-display {
-    font-family: 'Space Mono', monospace; font-size: 4.5em; font-weight: bold; color: #61dafb;
-    text-shadow: 0 0 10px rgba(97, 218, 251, 0.5); letter-spacing: 2px; margin: 15px 0;
-}
-body[data-theme="dark"] .pomodoro-time-display { color: #98fb98; text-shadow: 0 0 10px rgba(152, 251, 152, 0.5); }
 .stButton button {
     background-color: #4CAF50; color: white; padding: 10px 20px; border: none; border-radius: 8px;
     cursor: pointer; font-size: 1em; margin: 5px; transition: background-color 0.3s ease, transform 0.1s ease;
@@ -289,14 +589,11 @@ body[data-theme="dark"] .white-noise-container button { background-color: #333;
 
 
 # --- SOUND TRIGGER ---
-# This block checks flags and plays sounds. It's placed high to execute early on rerun.
-if st.session_state.get("play_pomodoro_finish_sound", False):
-    play_sound(POMODORO_FINISH_SOUND_URL, "pomodoro_finish")
-    st.session_state.play_pomodoro_finish_sound = False # Reset flag
-
-if st.session_state.get("play_tick_sound", False):
-    play_sound(TASK_TICK_SOUND_URL, f"tick_{time.time()}") # Use time to ensure key is unique
-    st.session_state.play_tick_sound = False # Reset flag
+# Called from the fragment whose callback set the flag, since a fragment rerun skips the rest of the page.
+def play_pending_sound(flag, sound_url):
+    if st.session_state.get(flag, False):
+        play_sound(sound_url, f"{flag}_{time.time()}") # Use time to ensure key is unique
+        st.session_state[flag] = False # Reset flag
 
 
 # --- WHITE NOISE PLAYER COMPONENT ---
@@ -332,55 +629,42 @@ def white_noise_player():
 
 
 # --- Add Pomodoro Timer to Layout ---
+def toggle_pomodoro_edit():
+    st.session_state.show_pomodoro_edit = not st.session_state.get("show_pomodoro_edit", False)
+
+@st.fragment # Timer buttons rerun only the timer
+@timed
 def pomodoro_timer_section():
     st.markdown('<div class="pomodoro-container">', unsafe_allow_html=True)
     st.subheader("🍅 Pomodoro Timer")
-
-    mode_display_placeholder = st.empty()
-    timer_display_placeholder = st.empty()
-
-    if st.session_state.pomodoro_running:
-        elapsed_time = time.time() - st.session_state.pomodoro_last_update_time
-        st.session_state.pomodoro_time_left -= elapsed_time
-        st.session_state.pomodoro_last_update_time = time.time()
-
-        if st.session_state.pomodoro_time_left <= 0:
-            st.session_state.pomodoro_time_left = 0
-            st.session_state.pomodoro_running = False
-            
-            # Set flag to play sound on the next rerun
-            st.session_state.play_pomodoro_finish_sound = True
-
-            st.success(f"{st.session_state.pomodoro_mode.replace('_', ' ').title()} session finished!", icon="✅")
-            toggle_mode()
-            st.rerun()
-
-    mode_display_placeholder.markdown(f"<p class='pomodoro-mode-text'>Mode: **{st.session_state.pomodoro_mode.replace('_', ' ').title()}**</p>", unsafe_allow_html=True)
-    timer_display_placeholder.markdown(f"<div class='pomodoro-time-display'>{format_time(st.session_state.pomodoro_time_left)}</div>", unsafe_allow_html=True)
+    play_pending_sound("play_pomodoro_finish_sound", POMODORO_FINISH_SOUND_URL)
+
+    finished_message = st.session_state.pop("pomodoro_finished_message", None)
+    if finished_message:
+        st.success(finished_message, icon="✅")
+
+    # The server is only involved on start, pause, reset and when a phase ends.
+    get_pomodoro_clock()(
+        mode=st.session_state.pomodoro_mode.replace('_', ' ').title(),
+        time_left=pomodoro_seconds_left(),
+        running=st.session_state.pomodoro_running,
+        token=st.session_state.pomodoro_last_update_time,
+        key="pomodoro_clock", on_change=on_pomodoro_clock_event, default=None,
+    )
 
     col_play_pause, col_reset, col_next, col_edit_toggle = st.columns(4)
 
     with col_play_pause:
         if st.session_state.pomodoro_running:
-            if st.button("⏸️ Pause", key="pomodoro_pause_btn"):
-                pause_pomodoro()
-                st.rerun()
+            st.button("⏸️ Pause", key="pomodoro_pause_btn", on_click=pause_pomodoro)
         else:
-            if st.button("▶️ Start", key="pomodoro_start_btn"):
-                start_pomodoro()
-                st.rerun()
+            st.button("▶️ Start", key="pomodoro_start_btn", on_click=start_pomodoro)
     with col_reset:
-        if st.button("🔄 Reset", key="pomodoro_reset_btn"):
-            reset_pomodoro()
-            st.rerun()
+        st.button("🔄 Reset", key="pomodoro_reset_btn", on_click=reset_pomodoro)
     with col_next:
-        if st.button("⏭️ Next Mode", key="pomodoro_toggle_btn"):
-            toggle_mode()
-            st.rerun()
+        st.button("⏭️ Next Mode", key="pomodoro_toggle_btn", on_click=toggle_mode)
     with col_edit_toggle:
-        if st.button("⚙️ Edit Durations", key="edit_duration_toggle"):
-            st.session_state.show_pomodoro_edit = not st.session_state.get("show_pomodoro_edit", False)
-            st.rerun()
+        st.button("⚙️ Edit Durations", key="edit_duration_toggle", on_click=toggle_pomodoro_edit)
 
     if st.session_state.get("show_pomodoro_edit", False):
         st.markdown("---")
@@ -398,11 +682,8 @@ def pomodoro_timer_section():
 
     st.markdown('</div>', unsafe_allow_html=True)
 
-    if st.session_state.pomodoro_running:
-        time.sleep(1)
-        st.rerun()
-
 # --- ADD NEW TASK FORM (No changes here) ---
+@timed
 def add_task_form():
     with st.sidebar.expander("➕ Add New Task", expanded=True):
         current_subjects_list = sorted(list(st.session_state.all_subjects))
@@ -453,13 +734,11 @@ def add_task_form():
                     "SN": sn_list, "LAQ": laq_list,
                     "Priority": priority_input, "Deadline": str(deadline_input)
                 }
-                check = {"SN": [False] * len(sn_list), "LAQ": [False] * len(laq_list)}
+                check = bitset.encode_check({}, task)
                 
                 key = save_task(task, check)
                 if key:
-                    st.session_state.tasks.append(task)
-                    st.session_state.task_checks.append(check)
-                    st.session_state.task_keys.append(key)
+                    st.session_state.task_store.upsert(key, task, check)
                     st.session_state.all_subjects.add(cleaned_subject)
                     
                     st.success(f"Task '{cleaned_chapter}' added successfully!", icon="✅")
@@ -467,10 +746,75 @@ def add_task_form():
                     st.session_state.chapter_input_val, st.session_state.sn_input_val, st.session_state.laq_input_val, st.session_state.new_subject_input_val = "", "", "", ""
                     
                     st.rerun()
-                else:
+                elif key is False:
                     st.error("Failed to add task. Please try again.", icon="❌")
 
+# --- BULK IMPORT ---
+def existing_tasks(pairs):
+    # The stored chapters of the subjects an import touches, so chapters already there are merged instead of duplicated.
+    flush_pending_writes()
+    existing = {}
+    for subject in {task["Subject"] for task, _ in pairs} & catalog_subjects().keys():
+        existing.update(get_replica().subject_snapshot(subject))
+    return existing
+
+def import_tasks(entries, progress):
+    # One multi-path update per chunk of tasks, sent in parallel; the session's store is updated as each chunk lands.
+    futures = {get_storage().submit("update", values): (records, values) for records, values in dataio.import_updates(entries, tasks_path(), catalog_path())}
+    imported, errors = 0, []
+    for future in concurrent.futures.as_completed(futures):
+        records, values = futures[future]
+        try:
+            future.result()
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        apply_to_replicas(values)
+        for key, record in records.items():
+            if record["task"]["Subject"] in st.session_state.loaded_subjects:
+                st.session_state.task_store.upsert(key, record["task"], record["check"])
+        forget_check_widgets(records)
+        imported += len(records)
+        progress.progress(imported / len(entries), text=f"Imported {imported}/{len(entries)} chapter(s)")
+    refresh_all_subjects()
+    return imported, errors
+
+@timed
+def bulk_import_form():
+    with st.sidebar.expander("📥 Bulk Import", expanded=False):
+        st.caption("CSV, JSON or JSON Lines with the export's columns: Subject, Chapter, Type (SN/LAQ), Task, Priority, Deadline, Status.")
+        uploaded = st.file_uploader("Tasks file", type=["csv", "json", "jsonl"], key="bulk_import_file")
+        if uploaded is not None and st.button("Import Tasks", key="bulk_import_button"):
+            try:
+                pairs, skipped = dataio.group_tasks(dataio.read_import(uploaded.getvalue(), uploaded.name))
+            except Exception as e:
+                st.error(f"Could not read '{uploaded.name}': {e}", icon="❌")
+                return
+            if not pairs:
+                st.warning("No tasks found in the file.")
+                return
+            # Chapters that already exist are merged: missing items are added and items marked done are ticked.
+            entries, unchanged = dataio.match_existing(pairs, existing_tasks(pairs))
+            merged = sum(key is not None for key, _, _, _ in entries)
+            if entries:
+                progress = st.progress(0.0, text="Importing...")
+                imported, errors = import_tasks(entries, progress)
+                if errors:
+                    st.error(f"{len(entries) - imported} of {len(entries)} chapter(s) could not be imported: {errors[0]}", icon="❌")
+                if imported == len(entries) and merged:
+                    st.success(f"Imported {imported - merged} new chapter(s) and updated {merged} existing one(s).", icon="✅")
+                elif imported == len(entries):
+                    items = sum(len(task["SN"]) + len(task["LAQ"]) for _, _, task, _ in entries)
+                    st.success(f"Imported {imported} chapter(s) with {items} item(s).", icon="✅")
+                elif imported:
+                    st.success(f"Imported {imported} chapter(s).", icon="✅")
+            if unchanged:
+                st.info(f"{unchanged} chapter(s) in the file are already up to date; left as they are.")
+            if skipped:
+                st.warning(f"Skipped {skipped} row(s) without a subject, chapter, text or an SN/LAQ type, or with a Deadline that is not a YYYY-MM-DD date.")
+
 # --- FILTER AND SEARCH (No changes here) ---
+@timed
 def filter_and_search_options():
     st.header("🔍 Filter & Search")
     col_priority, col_search = st.columns([0.5, 0.5])
@@ -487,6 +831,7 @@ def filter_and_search_options():
     st.divider()
 
 # --- MAIN CONTENT (FIX APPLIED HERE) ---
+@timed
 def subject_filter_section():
     current_display_subjects = sorted(list(st.session_state.all_subjects))
     if not current_display_subjects:
@@ -507,41 +852,60 @@ def subject_filter_section():
         on_change=update_subject_query_param,
         args=(st.session_state,) # Pass session_state to the callback
     )
+    # Subject-level progress comes straight from the catalog counters.
+    counts = catalog_subjects().get(st.session_state.selected_view_subject, {})
+    if counts.get("total"):
+        subject_pct = int(counts.get("done", 0) / counts["total"] * 100)
+        st.progress(subject_pct / 100, text=f"Overall: {subject_pct}% done ({counts.get('done', 0)}/{counts['total']}) across {counts.get('tasks', 0)} chapter(s)")
 
 def update_subject_query_param(session_state_ref):
     # This callback now handles both updating the URL and session state
     new_subject = session_state_ref.view_subject_select
     session_state_ref.selected_view_subject = new_subject
+    session_state_ref.task_page = 0
     st.query_params["subject"] = new_subject
 
 
+@timed
 def get_filtered_tasks():
-    filtered_tasks = []
-    search_lower = st.session_state.search_query.lower() if st.session_state.get('search_query') else ""
-    start_date_filter, end_date_filter = st.session_state.get('filter_start_date'), st.session_state.get('filter_end_date')
-    for i, task in enumerate(st.session_state.tasks):
-        if st.session_state.selected_view_subject is None or task.get("Subject") != st.session_state.selected_view_subject:
-            continue
-        if st.session_state.get('filter_priorities') and task.get("Priority") not in st.session_state.filter_priorities:
-            continue
-        if search_lower:
-            match_found = (search_lower in task.get("Chapter", "").lower() or
-                           any(search_lower in sn.lower() for sn in task.get("SN", [])) or
-                           any(search_lower in laq.lower() for laq in task.get("LAQ", [])))
-            if not match_found:
-                continue
-        task_deadline_str = task.get("Deadline")
-        if task_deadline_str:
-            try:
-                task_deadline = date.fromisoformat(task_deadline_str)
-                if start_date_filter and task_deadline < start_date_filter: continue
-                if end_date_filter and task_deadline > end_date_filter: continue
-            except ValueError: pass
-        elif start_date_filter or end_date_filter:
-            continue
-        filtered_tasks.append((i, task, st.session_state.task_checks[i], st.session_state.task_keys[i]))
-    return filtered_tasks
-
+    # Filtered and sorted (deadline, then priority) inside the task store, which memoizes the result
+    # until the filters or the tasks change, so reruns from other widgets skip both steps.
+    store = st.session_state.task_store
+    if st.session_state.selected_view_subject is None:
+        return []
+    rows = store.view(
+        subject=st.session_state.selected_view_subject,
+        priorities=st.session_state.get('filter_priorities'),
+        start_date=st.session_state.get('filter_start_date'),
+        end_date=st.session_state.get('filter_end_date'),
+        query=st.session_state.get('search_query'),
+    )
+    return [(int(i), store.tasks[i], store.checks[i], store.keys[i]) for i in rows]
+
+# --- PAGINATION ---
+# Only one page of task cards is rendered, so a rerun costs the same however many chapters a subject has.
+def page_count(filtered_tasks_data):
+    return max(1, -(-len(filtered_tasks_data) // TASKS_PER_PAGE))
+
+def current_page(filtered_tasks_data):
+    # Clamped here because filters can shrink the list under the stored page number.
+    st.session_state.task_page = min(st.session_state.task_page, page_count(filtered_tasks_data) - 1)
+    start = st.session_state.task_page * TASKS_PER_PAGE
+    return filtered_tasks_data[start:start + TASKS_PER_PAGE]
+
+def change_task_page(delta):
+    st.session_state.task_page = max(0, st.session_state.task_page + delta)
+
+def jump_to_task(positions):
+    key_fk = st.session_state.jump_to_task
+    if key_fk in positions:
+        st.session_state.task_page = positions[key_fk] // TASKS_PER_PAGE
+        st.session_state.scroll_to_task = key_fk
+        st.session_state.task_page_jumped = True
+    st.session_state.jump_to_task = None
+
+@st.fragment
+@timed
 def completion_overview_section():
     st.header("📈 Completion Overview")
     if st.session_state.selected_view_subject is None:
@@ -551,10 +915,19 @@ def completion_overview_section():
     if not filtered_tasks_data:
         st.info(f"No tasks found for the selected subject and current filters.")
         return
-    for i, task, checks, key_fk in filtered_tasks_data:
-        sn_done, laq_done = sum(checks.get("SN", [])), sum(checks.get("LAQ", []))
-        total_sn, total_laq = len(task.get("SN", [])), len(task.get("LAQ", []))
-        total_items, items_done = total_sn + total_laq, sn_done + laq_done
+    # Each key's position in the list, computed once; format_func runs for every option.
+    positions = {key_fk: position for position, (_, _, _, key_fk) in enumerate(filtered_tasks_data)}
+    labels = {key_fk: f"{task.get('Chapter', '')} (page {positions[key_fk] // TASKS_PER_PAGE + 1})" for _, task, _, key_fk in filtered_tasks_data}
+    # One widget covers every chapter; picking one turns the task list to its page and scrolls to it.
+    st.selectbox(
+        "Jump to chapter", list(positions), index=None, key="jump_to_task", placeholder="Jump to chapter...",
+        format_func=labels.__getitem__,
+        on_change=jump_to_task, args=(positions,),
+    )
+    if st.session_state.pop("task_page_jumped", False):
+        st.rerun() # The task list is outside this fragment
+    for i, task, checks, key_fk in current_page(filtered_tasks_data):
+        items_done, total_items = st.session_state.task_store.counts(i)
         pct = int((items_done / total_items * 100)) if total_items else 0
         st.markdown(f"""
         <a href="#task-{key_fk}" style="text-decoration: none; color: inherit;">
@@ -593,25 +966,20 @@ def display_edit_form(current_task_data, current_task_checks, current_key_fk):
             elif not new_sn_list and not new_laq_list:
                 st.error("At least one Short Note or Long Answer Question is required.", icon="❌")
             else:
-                new_checks_sn = [False] * len(new_sn_list)
-                for i, sn_item in enumerate(new_sn_list):
-                    try: new_checks_sn[i] = current_task_checks["SN"][current_task_data["SN"].index(sn_item)]
-                    except (ValueError, KeyError, IndexError): pass
-                new_checks_laq = [False] * len(new_laq_list)
-                for i, laq_item in enumerate(new_laq_list):
-                    try: new_checks_laq[i] = current_task_checks["LAQ"][current_task_data["LAQ"].index(laq_item)]
-                    except (ValueError, KeyError, IndexError): pass
-                updated_task = {"Subject": edited_subject.strip(), "Chapter": edited_chapter.strip(), "SN": new_sn_list, "LAQ": new_laq_list, "Priority": edited_priority, "Deadline": str(edited_deadline)}
-                updated_checks = {"SN": new_checks_sn, "LAQ": new_checks_laq}
+                edited_task = {"Subject": edited_subject.strip(), "Chapter": edited_chapter.strip(), "SN": new_sn_list, "LAQ": new_laq_list, "Priority": edited_priority, "Deadline": str(edited_deadline)}
+                # Items keep their IDs and ticks across reorders and renames; only the paths that changed are written.
+                updated_task, updated_checks, _ = edit_task(current_task_data, current_task_checks, edited_task)
+                changes = edit_changes(current_task_data, current_task_checks, updated_task, updated_checks)
                 with st.spinner("Saving changes..."):
-                    if save_task(updated_task, updated_checks, key=current_key_fk):
-                        st.cache_data.clear()
-                        st.session_state.tasks, st.session_state.task_checks, st.session_state.task_keys, st.session_state.all_subjects = load_tasks()
+                    counter_changes = catalog.merge_changes(catalog.task_changes(current_task_data, current_task_checks, -1, catalog_path()), catalog.task_changes(updated_task, updated_checks, 1, catalog_path()))
+                    saved = flush_pending_writes() and update_task_fields(current_key_fk, changes, counter_changes, change=edited_task)
+                    if saved:
+                        upsert_local_task(current_key_fk, updated_task, updated_checks)
                         st.session_state.editing_task_key = None
                         st.session_state.temp_edit_task_data = {}
                         st.success(f"Task '{updated_task['Chapter']}' updated successfully!", icon="✅")
                         st.rerun()
-                    else: st.error("Failed to save changes. Please try again.", icon="❌")
+                    elif saved is False: st.error("Failed to save changes. Please try again.", icon="❌")
     with col_cancel:
         if st.button("❌ Cancel Edit", key=f"cancel_edit_{current_key_fk}"):
             st.session_state.editing_task_key = None
@@ -619,6 +987,41 @@ def display_edit_form(current_task_data, current_task_checks, current_key_fk):
             st.rerun()
 
 # --- Display Task List (with Tick Sound) ---
+def on_check_toggle(task, checks, key_fk, kind, j):
+    # Runs before the rerun, so the new state renders immediately without waiting on the database.
+    value = st.session_state[f"{kind.lower()}_{key_fk}_{j}"]
+    st.session_state.task_store.set_check(key_fk, kind, j, value) # Keeps the store's done counts in step
+    save_check(key_fk, task.get("Subject"), kind, j, value, len(task.get(kind) or []))
+    if value:
+        st.session_state.play_tick_sound = True # Set flag to play sound
+
+def toggle_task_items(key_fk, expanded):
+    st.session_state[f"show_items_{key_fk}"] = not expanded
+
+def set_delete_confirm(key_fk, show):
+    st.session_state[f"show_confirm_{key_fk}"] = show
+
+def bulk_delete_section(filtered_tasks_data):
+    with st.expander("🗑️ Delete Several Chapters"):
+        chapters = {key_fk: task.get("Chapter", "") for _, task, _, key_fk in filtered_tasks_data}
+        selected = st.multiselect("Chapters to delete", list(chapters), format_func=chapters.get, key="bulk_delete_keys")
+        if selected and st.button(f"Delete {len(selected)} chapter(s)", key="bulk_delete_button", help="Bulk deletes cannot be undone."):
+            if not flush_pending_writes(): # Queued ticks for these chapters would otherwise recreate them
+                return
+            store = st.session_state.task_store
+            entries = [(key_fk, *store.get(key_fk)) for key_fk in selected if key_fk in store]
+            progress = st.progress(0.0, text="Deleting...")
+            deleted, errors = delete_tasks_from_db(entries, lambda done: progress.progress(done / len(entries), text=f"Deleted {done}/{len(entries)} chapter(s)"))
+            for key_fk in deleted:
+                store.remove(key_fk)
+            refresh_all_subjects()
+            if errors:
+                st.error(f"{len(entries) - len(deleted)} chapter(s) could not be deleted: {errors[0]}", icon="❌")
+            else:
+                del st.session_state.bulk_delete_keys
+                st.rerun()
+
+@timed
 def task_list_section():
     st.header("🗂️ Task List")
 
@@ -632,127 +1035,230 @@ def task_list_section():
         st.info(f"No tasks found for the selected subject and current filters/search query.")
         return
 
-    def sort_key_func(item):
-        task = item[1]
-        try: deadline = date.fromisoformat(task.get("Deadline", "9999-12-31"))
-        except ValueError: deadline = date.max
-        priority = {"High": 0, "Medium": 1, "Low": 2}.get(task.get("Priority", "Medium"), 1)
-        return (deadline, priority)
-
-    filtered_tasks_data.sort(key=sort_key_func)
-
-    for original_idx, task, checks, key_fk in filtered_tasks_data:
-        total_sn, total_laq = len(task.get("SN", [])), len(task.get("LAQ", []))
-        total_items = total_sn + total_laq
-        sn_checked_count, laq_checked_count = sum(checks.get("SN", [])), sum(checks.get("LAQ", []))
-        is_completed = (total_items > 0) and (sn_checked_count == total_sn) and (laq_checked_count == total_laq)
-        task_container_class = "task-item completed-task" if is_completed else "task-item"
-        st.markdown(f'<div id="task-{key_fk}" class="{task_container_class}">', unsafe_allow_html=True)
+    bulk_delete_section(filtered_tasks_data)
+    pages = page_count(filtered_tasks_data)
+    page_tasks = current_page(filtered_tasks_data)
+    if pages > 1:
+        col_prev, col_page, col_next = st.columns([0.2, 1, 0.2])
+        with col_prev:
+            st.button("◀️ Prev", key="task_page_prev", disabled=st.session_state.task_page == 0, on_click=change_task_page, args=(-1,))
+        with col_page:
+            st.caption(f"Page {st.session_state.task_page + 1} of {pages} ({len(filtered_tasks_data)} chapters)")
+        with col_next:
+            st.button("Next ▶️", key="task_page_next", disabled=st.session_state.task_page >= pages - 1, on_click=change_task_page, args=(1,))
+
+    for original_idx, task, checks, key_fk in page_tasks:
+        task_card(key_fk)
+        st.divider()
 
-        items_done = sn_checked_count + laq_checked_count
-        pct = int((items_done / total_items * 100)) if total_items else 0
+    scroll_key = st.session_state.pop("scroll_to_task", None)
+    if scroll_key:
+        components.html(f"""
+        <script>
+            setTimeout(function () {{
+                var card = window.parent.document.getElementById("task-{scroll_key}");
+                if (card) card.scrollIntoView({{behavior: "smooth"}});
+            }}, 300);
+        </script>""", height=0)
+
+@st.fragment # A checkbox tick reruns only its own card
+@timed
+def task_card(key_fk):
+    store = st.session_state.task_store
+    row = store.row_of(key_fk)
+    if row is None: # Deleted since the page was last drawn
+        return
+    task, checks = store.tasks[row], store.checks[row]
+    play_pending_sound("play_tick_sound", TASK_TICK_SOUND_URL)
+    items_done, total_items = store.counts(row)
+    is_completed = (total_items > 0) and (items_done == total_items)
+    task_container_class = "task-item completed-task" if is_completed else "task-item"
+    st.markdown(f'<div id="task-{key_fk}" class="{task_container_class}">', unsafe_allow_html=True)
 
-        if st.session_state.editing_task_key == key_fk:
-            display_edit_form(task, checks, key_fk)
-        else:
-            st.markdown(f"### {task['Chapter']} ({task.get('Priority')} Priority, Due: {task.get('Deadline')})")
-            st.progress(pct / 100, text=f"{pct}% done ({items_done}/{total_items})")
-            col1, col2, col3, col4 = st.columns([1, 1, 0.2, 0.2])
-            with col1:
-                if task.get("SN"):
-                    st.markdown("**📝 Short Notes**")
-                    for j, t in enumerate(task["SN"]):
-                        if st.checkbox(t, key=f"sn_{key_fk}_{j}", value=checks["SN"][j]):
-                            if not checks["SN"][j]:
-                                checks["SN"][j] = True
-                                save_task(task, checks, key=key_fk)
-                                st.session_state.play_tick_sound = True # Set flag to play sound
-                                st.rerun()
-                        elif checks["SN"][j]:
-                            checks["SN"][j] = False
-                            save_task(task, checks, key=key_fk)
-                            st.rerun()
-            with col2:
-                if task.get("LAQ"):
-                    st.markdown("**📄 Long Answer Questions**")
-                    for j, t in enumerate(task["LAQ"]):
-                        if st.checkbox(t, key=f"laq_{key_fk}_{j}", value=checks["LAQ"][j]):
-                            if not checks["LAQ"][j]:
-                                checks["LAQ"][j] = True
-                                save_task(task, checks, key=key_fk)
-                                st.session_state.play_tick_sound = True # Set flag to play sound
-                                st.rerun()
-                        elif checks["LAQ"][j]:
-                            checks["LAQ"][j] = False
-                            save_task(task, checks, key=key_fk)
-                            st.rerun()
-            with col3:
-                st.markdown("<br>", unsafe_allow_html=True)
-                if st.button("✏️ Edit", key=f"edit_btn_{key_fk}"):
-                    st.session_state.editing_task_key = key_fk
-                    st.session_state.temp_edit_task_data = task
-                    st.rerun()
-            with col4:
-                st.markdown("<br>", unsafe_allow_html=True)
-                if st.button("🗑️ Delete", key=f"del_btn_{key_fk}"):
-                    st.session_state[f"show_confirm_{key_fk}"] = True
-                    st.rerun()
+    pct = int((items_done / total_items * 100)) if total_items else 0
 
-        if st.session_state.get(f"show_confirm_{key_fk}", False):
-            st.warning(f"Are you sure you want to delete chapter '{task['Chapter']}'?", icon="⚠️")
-            col_yes, col_no = st.columns([0.1, 1])
-            with col_yes:
-                if st.button("Yes, Delete", key=f"confirm_del_yes_{key_fk}"):
-                    with st.spinner(f"Deleting '{task['Chapter']}'..."):
-                        if delete_task_from_db(key_fk):
-                            st.session_state.last_deleted = (task, checks, key_fk)
-                            st.cache_data.clear()
-                            st.session_state.tasks, st.session_state.task_checks, st.session_state.task_keys, st.session_state.all_subjects = load_tasks()
-                            st.success(f"Task '{task['Chapter']}' deleted successfully!", icon="✅")
-                            st.session_state[f"show_confirm_{key_fk}"] = False
-                            st.rerun()
-                        else: st.error(f"Failed to delete '{task['Chapter']}'. Please try again.", icon="❌")
-            with col_no:
-                if st.button("No, Cancel", key=f"confirm_del_no_{key_fk}"):
-                    st.session_state[f"show_confirm_{key_fk}"] = False
-                    st.rerun()
+    if st.session_state.editing_task_key == key_fk:
+        display_edit_form(task, checks, key_fk)
+    else:
+        st.markdown(f"### {task['Chapter']} ({task.get('Priority')} Priority, Due: {task.get('Deadline')})")
+        st.progress(pct / 100, text=f"{pct}% done ({items_done}/{total_items})")
+        # Chapters already finished when first shown start collapsed; a collapsed card creates no checkboxes.
+        expanded = st.session_state.setdefault(f"show_items_{key_fk}", not is_completed)
+        col1, col2, col3, col4 = st.columns([1, 1, 0.2, 0.2])
+        with col1:
+            if not expanded:
+                st.button(f"🔽 Show {total_items} item(s)", key=f"items_toggle_{key_fk}", on_click=toggle_task_items, args=(key_fk, expanded))
+            elif task.get("SN"):
+                st.markdown("**📝 Short Notes**")
+                for j, (t, done) in enumerate(zip(task["SN"], store.states(row, "SN"))):
+                    st.checkbox(t, key=f"sn_{key_fk}_{j}", value=done, on_change=on_check_toggle, args=(task, checks, key_fk, "SN", j))
+        with col2:
+            if expanded and task.get("LAQ"):
+                st.markdown("**📄 Long Answer Questions**")
+                for j, (t, done) in enumerate(zip(task["LAQ"], store.states(row, "LAQ"))):
+                    st.checkbox(t, key=f"laq_{key_fk}_{j}", value=done, on_change=on_check_toggle, args=(task, checks, key_fk, "LAQ", j))
+        with col3:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("✏️ Edit", key=f"edit_btn_{key_fk}"):
+                st.session_state.editing_task_key = key_fk
+                st.session_state.temp_edit_task_data = task
+                st.rerun()
+        with col4:
+            st.markdown("<br>", unsafe_allow_html=True)
+            st.button("🗑️ Delete", key=f"del_btn_{key_fk}", on_click=set_delete_confirm, args=(key_fk, True))
+
+    if st.session_state.get(f"show_confirm_{key_fk}", False):
+        st.warning(f"Are you sure you want to delete chapter '{task['Chapter']}'?", icon="⚠️")
+        col_yes, col_no = st.columns([0.1, 1])
+        with col_yes:
+            if st.button("Yes, Delete", key=f"confirm_del_yes_{key_fk}"):
+                with st.spinner(f"Deleting '{task['Chapter']}'..."):
+                    deleted = flush_pending_writes() and delete_task_from_db(key_fk, task, checks)
+                    if deleted:
+                        st.session_state.last_deleted = (task, checks, key_fk)
+                        remove_local_task(key_fk)
+                        st.success(f"Task '{task['Chapter']}' deleted successfully!", icon="✅")
+                        st.session_state[f"show_confirm_{key_fk}"] = False
+                        st.rerun()
+                    elif deleted is False: st.error(f"Failed to delete '{task['Chapter']}'. Please try again.", icon="❌")
+        with col_no:
+            st.button("No, Cancel", key=f"confirm_del_no_{key_fk}", on_click=set_delete_confirm, args=(key_fk, False))
 
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.divider()
+    st.markdown('</div>', unsafe_allow_html=True)
 
 # --- UNDO DELETE / EXPORT (No changes here) ---
+@timed
 def undo_delete_section():
     if "last_deleted" in st.session_state and st.session_state.last_deleted is not None:
         if st.button("↩️ Undo Last Delete", key="undo_delete_button"):
             task_to_restore, checks_to_restore, key_to_restore = st.session_state.last_deleted
             with st.spinner("Restoring task..."):
-                if save_task(task_to_restore, checks_to_restore, key_to_restore):
-                    st.cache_data.clear()
-                    st.session_state.tasks, st.session_state.task_checks, st.session_state.task_keys, st.session_state.all_subjects = load_tasks()
+                restored = save_task(task_to_restore, checks_to_restore, key_to_restore)
+                if restored:
+                    upsert_local_task(key_to_restore, task_to_restore, checks_to_restore)
                     st.session_state.last_deleted = None
                     st.success("Task restored successfully!", icon="✅")
                     st.rerun()
-                else: st.error("Failed to undo delete. Please try again.", icon="❌")
+                elif restored is False: st.error("Failed to undo delete. Please try again.", icon="❌")
+
+def status_busy():
+    # Whether the save status can still change on its own: writes queued or unconfirmed, a failed write, or offline.
+    queue, backend = get_write_queue(), get_storage()
+    if isinstance(backend, OfflineBackend) and (backend.online is False or backend.pending_count):
+        return True
+    return bool(queue.pending_count or queue.last_error)
+
+@timed
+def write_status_section():
+    # Drawn by sync_watcher, so it is refreshed on the same timer as live changes and only while one is set.
+    queue, backend = get_write_queue(), get_storage()
+    if isinstance(backend, OfflineBackend) and backend.online is False:
+        st.warning(f"📴 Offline: {backend.pending_count} change(s) saved on this device, syncing when the database is reachable.", icon="⚠️")
+        if st.button("🔁 Retry Sync", key="retry_sync_button"):
+            backend.sync_now()
+    elif isinstance(backend, OfflineBackend) and backend.pending_count:
+        st.caption(f"⏳ Syncing {backend.pending_count} change(s)...")
+    if queue.last_error:
+        st.error(f"Some changes could not be saved: {queue.last_error}", icon="⚠️")
+        if st.button("🔁 Retry Saving", key="retry_flush_button"):
+            flush_pending_writes()
+            st.rerun()
+    elif queue.pending_count:
+        st.caption(f"⏳ Saving {queue.pending_count} change(s)...")
+    elif queue.last_flush_at:
+        st.caption(f"✅ All changes saved ({time.strftime('%H:%M:%S', time.localtime(queue.last_flush_at))})")
+
+def export_pairs(scope, subject):
+    # Built when a download starts (on Streamlit's download thread), so it must not touch st.session_state.
+    store, replica, subjects = st.session_state.task_store, get_replica(), sorted(catalog_subjects())
+    def pairs():
+        if scope == "Current subject":
+            for i in store.filter(subject=subject):
+                yield store.tasks[i], store.checks[i]
+        else:
+            for name in subjects:
+                for value in replica.subject_snapshot(name).values():
+                    yield value.get("task", {}), value.get("check", {})
+    return pairs
 
+@st.fragment
+@timed
 def export_csv_section():
     st.header("⬇️ Export Tasks")
-    rows = []
-    for i, task in enumerate(st.session_state.tasks):
-        if task.get("Subject") == st.session_state.selected_view_subject:
-            checks = st.session_state.task_checks[i]
-            for j, t in enumerate(task.get("SN",[])):
-                rows.append([task["Subject"],task["Chapter"],"SN",t,task["Priority"],task["Deadline"], "Done" if checks["SN"][j] else "Pending"])
-            for j, t in enumerate(task.get("LAQ",[])):
-                rows.append([task["Subject"],task["Chapter"],"LAQ",t,task["Priority"],task["Deadline"], "Done" if checks["LAQ"][j] else "Pending"])
-    if rows:
-        df = pd.DataFrame(rows, columns=["Subject","Chapter","Type","Task","Priority","Deadline", "Status"])
-        csv = df.to_csv(index=False).encode()
-        st.download_button("Export Current Subject's Tasks to CSV", csv, f"{st.session_state.selected_view_subject}_tasks.csv", "text/csv")
-    else: st.info("No tasks to export for the selected subject.")
+    subject = st.session_state.selected_view_subject
+    col_scope, col_format = st.columns([0.5, 0.5])
+    with col_scope:
+        scope = st.radio("Export", ["Current subject", "All subjects"], horizontal=True, key="export_scope")
+    with col_format:
+        fmt = st.radio("Format", dataio.available_formats(), horizontal=True, key="export_format")
+    if scope == "Current subject" and not len(st.session_state.task_store.filter(subject=subject)):
+        st.info("No tasks to export for the selected subject.")
+        return
+    if scope == "All subjects" and not catalog_subjects():
+        st.info("No tasks to export yet.")
+        return
+    extension, mime = dataio.EXPORT_FORMATS[fmt]
+    file_name = f"{subject if scope == 'Current subject' else 'all_subjects'}_tasks.{extension}"
+    make_pairs = export_pairs(scope, subject)
+    # The file is only generated when the button is clicked; reruns cost nothing. It is built in memory (see dataio.py).
+    st.download_button(
+        f"Export {scope.lower()} to {fmt}", lambda: dataio.export_bytes(make_pairs(), fmt), file_name, mime,
+        on_click=flush_pending_writes,
+    )
+
+def metrics_debug_panel(trace):
+    # Opt-in with [metrics] debug_panel = true: where the last full rerun spent its time, plus process totals.
+    if not st.secrets.get("metrics", {}).get("debug_panel", False):
+        return
+    with st.sidebar.expander("🛠️ Debug: Rerun Timings"):
+        st.caption(f"Last full rerun: {trace.duration * 1000:.1f} ms (timer and task card reruns are only in the totals)")
+        rows = [f"| `{name}` | {count} | {seconds * 1000:.1f} |" for name, (count, seconds) in trace.totals().items()]
+        if rows:
+            st.markdown("| Span | Calls | ms |\n|---|---:|---:|\n" + "\n".join(rows))
+        totals = get_metrics().snapshot()
+        counters = {**totals["counters"], **{f"{name} (this rerun)": value for name, value in trace.counters.items()}}
+        if counters:
+            st.markdown("\n".join(f"- `{name}`: {value:,}" for name, value in counters.items()))
+        slowest = sorted(totals["spans"].items(), key=lambda item: -item[1]["total_ms"])[:8]
+        if slowest:
+            st.caption("Process totals (slowest first)")
+            st.markdown("| Span | Calls | Total ms | Max ms |\n|---|---:|---:|---:|\n" + "\n".join(
+                f"| `{name}` | {stats['count']} | {stats['total_ms']:.1f} | {stats['max_ms']:.1f} |" for name, stats in slowest
+            ))
+
+def sync_watcher():
+    # Compares version counters of the local replica and patches in what other devices changed; only then is there a full rerun.
+    if get_replica().is_live and st.session_state.replica_version != get_replica().version and not get_write_queue().pending_count:
+        if pull_replica_changes(): # False when the new version only carries this session's own writes
+            st.rerun(scope="app")
+    if st.session_state.sync_interval and not get_replica().is_live and not status_busy():
+        st.rerun(scope="app") # Everything is saved: one full rerun draws the final status and drops the timer
+    write_status_section()
+
+def sync_watcher_fragment():
+    # The timer is set per full rerun and only while there is something to wait for: a live replica that other
+    # devices may change, or writes still being saved. Otherwise the status is static and an idle tab never reruns;
+    # the next rerun picks up a new tick's "Saving..." state.
+    st.session_state.sync_interval = LIVE_SYNC_INTERVAL_SECS if get_replica().is_live or status_busy() else None
+    st.fragment(sync_watcher, run_every=st.session_state.sync_interval)()
+
+@timed
+def user_section():
+    def switch_user():
+        uid = partitions.normalize_user(st.session_state.user_switch_input)
+        if uid:
+            st.query_params["user"] = uid
+        st.session_state.user_switch_input = ""
+    st.sidebar.caption(f"👤 Tracking as **{current_user()}**")
+    st.sidebar.text_input("Switch user", key="user_switch_input", placeholder="Another name...", on_change=switch_user)
 
 # --- Render Sections ---
+user_section()
 add_task_form()
+bulk_import_form()
 st.sidebar.divider()
+with st.sidebar:
+    sync_watcher_fragment()
 undo_delete_section()
 
 filter_and_search_options()
@@ -764,3 +1270,4 @@ st.divider()
 task_list_section()
 st.divider()
 export_csv_section()
+metrics_debug_panel(get_metrics().end_rerun(rerun_trace))
@@ -0,0 +1,145 @@
+"""Microbenchmarks for the task data paths.
+
+Runs the code behind ``load_tasks``, ``get_filtered_tasks``, the task list
+sort, the edit form's item diff and the export against synthetic trees
+(see ``synthetic.py``) held in a ``MemoryBackend``, and reports wall time and
+peak traced memory per size::
+
+    python benchmarks.py                       # 10 .. 100k items
+    python benchmarks.py --sizes 1000,10000 --only filter --json bench.jsonl
+
+Streamlit is not involved: each benchmark calls the same module functions the
+app calls (``TaskReplica``, ``TaskStore``, ``edit_task``, ``dataio``).
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import date
+
+import dataio
+import synthetic
+from replica import TaskReplica
+from storage import MemoryBackend
+from taskstore import TaskStore, edit_changes, edit_task
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+
+def _largest_subject(tasks):
+    counts = {}
+    for value in tasks.values():
+        counts[value["task"]["Subject"]] = counts.get(value["task"]["Subject"], 0) + 1
+    return max(counts, key=counts.get)
+
+
+def _loaded_store(tree, subject):
+    replica = TaskReplica(MemoryBackend(tree), "tasks", lazy_subjects=True)
+    return TaskStore(replica.subject_snapshot(subject))
+
+
+# Each benchmark takes (tree, subject), does its untimed setup and returns the callable to time.
+def bench_load_tasks(tree, subject):
+    backend = MemoryBackend(tree)
+    def run():
+        # A new process: cold replica, one indexed subject query, then the session's store.
+        replica = TaskReplica(backend, "tasks", lazy_subjects=True)
+        return TaskStore(replica.subject_snapshot(subject))
+    return run
+
+
+def bench_filter(tree, subject):
+    store = _loaded_store(tree, subject)
+    return lambda: store.filter(subject, ["High", "Medium"], date(2026, 3, 1), date(2026, 9, 30))
+
+
+def bench_search(tree, subject):
+    store = _loaded_store(tree, subject)
+    return lambda: store.filter(subject, query="cardiac")
+
+
+def bench_filter_cached(tree, subject):
+    store = _loaded_store(tree, subject)
+    store.view(subject, ["High", "Medium"])
+    return lambda: store.view(subject, ["High", "Medium"])
+
+
+def bench_sort(tree, subject):
+    store = _loaded_store(tree, subject)
+    rows = store.filter(subject)
+    return lambda: store.sort_rows(rows)
+
+
+def bench_edit_task(tree, subject):
+    # Every chapter of the subject edited with its SN list reversed and one LAQ dropped, diffed and turned into paths.
+    edits = []
+    for value in tree["tasks"].values():
+        task = value["task"]
+        if task["Subject"] == subject:
+            edits.append((task, value["check"], {**task, "SN": task["SN"][::-1], "LAQ": task["LAQ"][1:]}))
+    return lambda: [edit_changes(old, checks, *edit_task(old, checks, new)[:2]) for old, checks, new in edits]
+
+
+def bench_export_csv(tree, subject):
+    pairs = [(value["task"], value["check"]) for value in tree["tasks"].values() if value["task"]["Subject"] == subject]
+    return lambda: dataio.export_bytes(pairs, "CSV")
+
+
+BENCHMARKS = {
+    "load_tasks": bench_load_tasks,
+    "filter": bench_filter,
+    "search": bench_search,
+    "filter_cached": bench_filter_cached,
+    "sort": bench_sort,
+    "edit_task": bench_edit_task,
+    "export_csv": bench_export_csv,
+}
+
+
+def measure(run, repeat):
+    """Returns ``(median_ms, min_ms, peak_kib)``; memory is traced on a separate, untimed call."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), min(times), peak / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated item counts")
+    parser.add_argument("--only", help="run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (fewer on the largest sizes)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="append results as JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.only or args.only in name]
+    print(f"{'benchmark':<16}{'items':>9}{'subject':>9}{'median ms':>12}{'min ms':>10}{'peak KiB':>11}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        tree = synthetic.generate_tree(size, seed=args.seed)
+        subject = _largest_subject(tree["tasks"])
+        items = synthetic.count_items(tree["tasks"])
+        subject_items = synthetic.count_items({k: v for k, v in tree["tasks"].items() if v["task"]["Subject"] == subject})
+        repeat = max(1, args.repeat if size < 50000 else args.repeat // 2)
+        for name in names:
+            median_ms, min_ms, peak_kib = measure(BENCHMARKS[name](tree, subject), repeat)
+            print(f"{name:<16}{items:>9}{subject_items:>9}{median_ms:>12.3f}{min_ms:>10.3f}{peak_kib:>11.1f}")
+            if args.json:
+                with open(args.json, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({
+                        "benchmark": name, "items": items, "subject_items": subject_items, "median_ms": round(median_ms, 3),
+                        "min_ms": round(min_ms, 3), "peak_kib": round(peak_kib, 1), "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    }) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compact encoding for SN/LAQ completion checks.
+
+A task's ticks used to be stored as JSON arrays of booleans
+(``{"SN": [false, true, ...], "LAQ": [...]}``), which Firebase keeps as one
+node per item. Each list is now a single string::
+
+    "b1:<item count>:<base64 bitmask>"
+
+where bit ``i`` of the little-endian mask is item ``i``. A 40-item list takes
+about 15 characters instead of roughly 240, and done counts are a popcount
+of the mask. Every function here also accepts the old formats (a list, or the
+dict Firebase returns for a sparse list), so data written before the
+migration in ``manage.py encode-checks`` keeps working.
+"""
+import base64
+
+KINDS = ("SN", "LAQ")
+PREFIX = "b1"
+
+
+def is_encoded(value):
+    return isinstance(value, str) and value.startswith(PREFIX + ":")
+
+
+def to_mask(value):
+    """Returns ``(mask, length)`` for an encoded string, a list of booleans or ``None``."""
+    if is_encoded(value):
+        _, length, data = value.split(":", 2)
+        return int.from_bytes(base64.b64decode(data), "little"), int(length)
+    if isinstance(value, dict):
+        # Firebase returns a sparse list as a dict keyed by index.
+        value = {int(k): v for k, v in value.items() if str(k).isdigit()}
+        length = max(value, default=-1) + 1
+        return sum(1 << i for i, v in value.items() if v), length
+    mask = 0
+    for i, v in enumerate(value or []):
+        if v:
+            mask |= 1 << i
+    return mask, len(value or [])
+
+
+def from_mask(mask, length):
+    mask &= (1 << length) - 1
+    return f"{PREFIX}:{length}:{base64.b64encode(mask.to_bytes((length + 7) // 8, 'little')).decode()}"
+
+
+def encode(states):
+    """Encodes one list of tick states (any accepted format) as a ``b1`` string."""
+    return from_mask(*to_mask(states))
+
+
+def decode(value, length=None):
+    """Returns the states as a list of booleans, padded with False or cut to ``length`` if given."""
+    mask, stored = to_mask(value)
+    return [bool(mask >> i & 1) for i in range(stored if length is None else length)]
+
+
+def count(value):
+    """Number of ticked items, without building a list."""
+    return to_mask(value)[0].bit_count()
+
+
+def with_state(value, index, state, length=None):
+    """``value`` with item ``index`` set to ``state``, encoded; ``length`` is the item count if known."""
+    mask, stored = to_mask(value)
+    mask = mask | 1 << index if state else mask & ~(1 << index)
+    return from_mask(mask, max(stored if length is None else length, index + 1))
+
+
+def encode_check(check, task=None):
+    """Encodes every kind of a check dict; with ``task``, each list is sized to the task's items."""
+    encoded = {}
+    for kind in KINDS:
+        mask, length = to_mask((check or {}).get(kind))
+        encoded[kind] = from_mask(mask, len(task.get(kind) or []) if task is not None else length)
+    return encoded
+
+
+def needs_encoding(check):
+    return any((check or {}).get(kind) is not None and not is_encoded(check[kind]) for kind in KINDS)
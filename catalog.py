@@ -0,0 +1,112 @@
+"""Materialized subject catalog.
+
+Next to the task tree the database keeps one small node per subject::
+
+    subjects/s_<escaped name>: {"name": "Anatomy", "tasks": 12, "done": 40, "total": 310, "rev": 57}
+
+Every write that changes a subject's tasks carries the matching counter
+increments in the same multi-path update, so the catalog stays consistent
+with the tasks and the subject picker never needs the task tree. ``rev``
+counts those writes, so an unchanged entry means the subject's tasks are
+unchanged too (``replica.py`` revalidates lazily loaded subjects with it).
+
+Keys carry an ``s_`` prefix so they are never all digits: Firebase returns a
+node whose keys are small integers as a JSON array, which would turn a
+catalog of subjects named "0", "1", ... into a list.
+"""
+import bitset
+from storage import increment, is_increment
+
+CATALOG_PATH = "subjects"
+KEY_PREFIX = "s_"
+
+# Characters Firebase does not allow in keys, plus the escape character itself.
+_KEY_ESCAPES = {ch: f"%{ord(ch):02X}" for ch in "%.#$[]/"}
+
+
+def escape_key(text):
+    return "".join(_KEY_ESCAPES.get(ch, ch) for ch in text)
+
+
+def subject_key(subject):
+    return KEY_PREFIX + escape_key(subject)
+
+
+def _entries(node):
+    # A node read back from the database may come as a list (see the module docstring).
+    if isinstance(node, list):
+        return [entry for entry in node if entry is not None]
+    return list((node or {}).values())
+
+
+def is_current(catalog):
+    """Whether a stored catalog uses this module's keys; older ones are rebuilt from the tasks."""
+    return isinstance(catalog, dict) and all(key.startswith(KEY_PREFIX) for key in catalog)
+
+
+def task_counts(task, check):
+    """Returns ``(done, total)`` SN/LAQ items for one task; ``check`` may be encoded or a legacy list."""
+    done = sum(bitset.count(check.get(kind)) for kind in bitset.KINDS)
+    total = len(task.get("SN") or []) + len(task.get("LAQ") or [])
+    return done, total
+
+
+def counter_path(subject, field, catalog_path=CATALOG_PATH):
+    return f"{catalog_path}/{subject_key(subject)}/{field}"
+
+
+def counter_changes(subject, tasks=0, done=0, total=0, catalog_path=CATALOG_PATH):
+    """Multi-path update entries that move a subject's counters by the given deltas."""
+    if not subject:
+        return {}
+    changes = {
+        counter_path(subject, field, catalog_path): increment(delta)
+        for field, delta in (("tasks", tasks), ("done", done), ("total", total)) if delta
+    }
+    if changes:
+        changes[counter_path(subject, "rev", catalog_path)] = increment(1)
+        changes[counter_path(subject, "name", catalog_path)] = subject
+    return changes
+
+
+def task_changes(task, check, sign, catalog_path=CATALOG_PATH):
+    """Counter updates for adding (``sign=1``) or removing (``sign=-1``) a whole task."""
+    done, total = task_counts(task, check)
+    return counter_changes(task.get("Subject"), tasks=sign, done=sign * done, total=sign * total, catalog_path=catalog_path)
+
+
+def merge_changes(*change_sets):
+    """Combines counter updates, adding up increments that hit the same path."""
+    merged = {}
+    for changes in change_sets:
+        for path, value in changes.items():
+            if path in merged and is_increment(value):
+                merged[path] = increment(merged[path][".sv"]["increment"] + value[".sv"]["increment"])
+            else:
+                merged[path] = value
+    return {path: value for path, value in merged.items() if not (is_increment(value) and value[".sv"]["increment"] == 0)}
+
+
+def build_catalog(tasks_tree):
+    """Computes the whole catalog from a task tree (used by ``manage.py rebuild-catalog``)."""
+    catalog = {}
+    for value in _entries(tasks_tree):
+        task, check = value.get("task", {}), value.get("check", {})
+        subject = task.get("Subject")
+        if not subject:
+            continue
+        entry = catalog.setdefault(subject_key(subject), {"name": subject, "tasks": 0, "done": 0, "total": 0})
+        done, total = task_counts(task, check)
+        entry["tasks"] += 1
+        entry["done"] += done
+        entry["total"] += total
+    return catalog
+
+
+def subjects_in(catalog):
+    """Maps subject name to its catalog entry, skipping subjects with no tasks left."""
+    return {
+        entry["name"]: entry
+        for entry in _entries(catalog)
+        if isinstance(entry, dict) and entry.get("name") and entry.get("tasks", 0) > 0
+    }
@@ -0,0 +1,246 @@
+"""Task export in CSV, JSON Lines and Parquet, and bulk import from CSV/JSON.
+
+An export is one row per SN/LAQ item with the columns in ``EXPORT_COLUMNS``.
+Rows are produced a chunk of tasks at a time: each chunk's columns are
+built with ``itertools.chain``/NumPy rather than row-by-row appends, turned
+into one DataFrame and encoded before the next chunk is built, so the
+intermediate frames stay bounded by the chunk size. The finished file is
+held in memory, though: Streamlit's download button needs the whole
+export as bytes, so memory use is O(size of the export). Nothing runs until
+the caller asks for the file.
+
+pandas (and pyarrow, for Parquet) are imported on first use, so loading this
+module costs nothing at app startup.
+
+Imports take the same columns. Rows are grouped into one task per
+(Subject, Chapter) and written a chunk of tasks per multi-path update, each
+carrying its catalog counters, instead of one round trip per task. A chapter
+that already exists is merged into rather than added again, so importing
+the app's own export changes nothing.
+"""
+import importlib.util
+import io
+import itertools
+import json
+import uuid
+from datetime import date
+
+import numpy as np
+
+import bitset
+import catalog
+import taskstore
+
+EXPORT_COLUMNS = ["Subject", "Chapter", "Type", "Task", "Priority", "Deadline", "Status"]
+EXPORT_CHUNK_TASKS = 500
+IMPORT_CHUNK_TASKS = 250
+IMPORT_REQUIRED_COLUMNS = ["Subject", "Chapter", "Type", "Task"]
+
+# Label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "JSON Lines": ("jsonl", "application/x-ndjson"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_formats():
+    """Format labels usable here; Parquet needs the optional ``pyarrow`` package."""
+    if importlib.util.find_spec("pyarrow") is None:
+        return [label for label in EXPORT_FORMATS if label != "Parquet"]
+    return list(EXPORT_FORMATS)
+
+
+def chunks(pairs, size):
+    pairs = iter(pairs)
+    while True:
+        chunk = list(itertools.islice(pairs, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _chunk_frame(chunk):
+    """One DataFrame for a list of ``(task, check)`` pairs, items in task order (SN before LAQ)."""
+    import pandas as pd
+    parts = []
+    for kind in ("SN", "LAQ"):
+        items = [task.get(kind) or [] for task, _ in chunk]
+        counts = np.fromiter((len(texts) for texts in items), dtype=np.int64, count=len(chunk))
+        if not counts.sum():
+            continue
+        done = np.fromiter(
+            itertools.chain.from_iterable(bitset.decode(check.get(kind), len(texts)) for (_, check), texts in zip(chunk, items)),
+            dtype=bool, count=int(counts.sum()),
+        )
+        parts.append((np.repeat(np.arange(len(chunk)), counts), kind, list(itertools.chain.from_iterable(items)), done))
+    if not parts:
+        return pd.DataFrame(columns=EXPORT_COLUMNS)
+    owner = np.concatenate([part[0] for part in parts])
+    order = np.argsort(owner, kind="stable")
+    owner = owner[order]
+    fields = {
+        field: np.array([task.get(field, "") for task, _ in chunk], dtype=object)[owner]
+        for field in ("Subject", "Chapter", "Priority", "Deadline")
+    }
+    return pd.DataFrame({
+        "Subject": fields["Subject"],
+        "Chapter": fields["Chapter"],
+        "Type": np.concatenate([np.full(len(part[2]), part[1], dtype=object) for part in parts])[order],
+        "Task": np.array(list(itertools.chain.from_iterable(part[2] for part in parts)), dtype=object)[order],
+        "Priority": fields["Priority"],
+        "Deadline": fields["Deadline"],
+        "Status": np.where(np.concatenate([part[3] for part in parts])[order], "Done", "Pending").astype(object),
+    }, columns=EXPORT_COLUMNS)
+
+
+def iter_frames(pairs, chunk_tasks=EXPORT_CHUNK_TASKS):
+    """Yields export DataFrames for an iterable of ``(task, check)`` pairs."""
+    for chunk in chunks(pairs, chunk_tasks):
+        frame = _chunk_frame(chunk)
+        if len(frame):
+            yield frame
+
+
+def write_export(pairs, fmt, out, chunk_tasks=EXPORT_CHUNK_TASKS):
+    """Writes the export to the binary file ``out``; returns the number of rows written."""
+    rows = 0
+    if fmt == "Parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+        with pq.ParquetWriter(out, schema) as writer:
+            for frame in iter_frames(pairs, chunk_tasks):
+                writer.write_table(pa.Table.from_pandas(frame.astype(str), schema=schema, preserve_index=False))
+                rows += len(frame)
+    else:
+        for frame in iter_frames(pairs, chunk_tasks):
+            if fmt == "CSV":
+                out.write(frame.to_csv(index=False, header=not rows).encode())
+            elif fmt == "JSON Lines":
+                out.write(frame.to_json(orient="records", lines=True, force_ascii=False).encode())
+            else:
+                raise ValueError(f"Unknown export format: {fmt}")
+            rows += len(frame)
+    return rows
+
+
+def export_bytes(pairs, fmt, chunk_tasks=EXPORT_CHUNK_TASKS):
+    """The finished export as bytes (Streamlit's download button needs bytes); empty if nothing to export."""
+    out = io.BytesIO()
+    if not write_export(pairs, fmt, out, chunk_tasks):
+        return b""
+    return out.getvalue()
+
+
+def read_import(data, file_name):
+    """Parses an uploaded CSV, JSON array or JSON Lines file into a DataFrame of export columns."""
+    import pandas as pd
+    if file_name.lower().endswith(".csv"):
+        frame = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    else:
+        text = data.decode("utf-8-sig").strip()
+        rows = json.loads(text) if text.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+        frame = pd.DataFrame(rows, dtype=str).fillna("")
+    missing = [column for column in IMPORT_REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    for column in EXPORT_COLUMNS:
+        if column not in frame.columns:
+            frame[column] = ""
+    return frame[EXPORT_COLUMNS].astype(str).apply(lambda column: column.str.strip())
+
+
+def group_tasks(frame):
+    """Groups import rows into ``(task, check)`` pairs, one per (Subject, Chapter), in file order.
+
+    Returns the pairs and the number of rows skipped (no subject/chapter/text, a Type
+    other than SN/LAQ, or a Deadline that is not an ISO date). Priority and Deadline
+    come from a chapter's first row; deadlines are stored as ``YYYY-MM-DD``.
+    """
+    deadlines = frame["Deadline"].map(taskstore.parse_deadline)
+    frame = frame.assign(
+        Type=frame["Type"].str.upper(),
+        Deadline=[date.fromordinal(day).isoformat() if day >= 0 else "" for day in deadlines],
+    )
+    valid = (frame["Subject"] != "") & (frame["Chapter"] != "") & (frame["Task"] != "") & frame["Type"].isin(["SN", "LAQ"])
+    valid &= deadlines != taskstore.INVALID_DEADLINE
+    skipped = int((~valid).sum())
+    frame = frame[valid]
+    tasks = {}
+    columns = (frame[column].tolist() for column in ("Subject", "Chapter", "Type", "Task", "Priority", "Deadline"))
+    done = (frame["Status"].str.lower() == "done").tolist()
+    for subject, chapter, kind, text, priority, deadline, is_done in zip(*columns, done):
+        pair = tasks.get((subject, chapter))
+        if pair is None:
+            priority = priority.title() if priority.title() in ("High", "Medium", "Low") else "Medium"
+            pair = tasks[(subject, chapter)] = (
+                {"Subject": subject, "Chapter": chapter, "SN": [], "LAQ": [], "Priority": priority, "Deadline": deadline},
+                {"SN": [], "LAQ": []},
+            )
+        pair[0][kind].append(text)
+        pair[1][kind].append(is_done)
+    return list(tasks.values()), skipped
+
+
+def match_existing(pairs, existing):
+    """Matches imported chapters to ``existing`` ones (``{key: {"task": ..., "check": ...}}``) by (Subject, Chapter).
+
+    Returns ``(entries, unchanged)``. Each entry is ``(key, old, task, check)``; ``key``
+    and ``old`` are None for a new chapter. An existing chapter keeps its items, ticks,
+    Priority and Deadline, gains the imported items it lacks and has the items the
+    import marks done ticked. Chapters the import would not change are only counted.
+    """
+    by_name = {}
+    for key, value in existing.items():
+        task = value.get("task", {})
+        by_name.setdefault((task.get("Subject"), task.get("Chapter")), (key, value))
+    entries, unchanged = [], 0
+    for task, check in pairs:
+        match = by_name.get((task["Subject"], task["Chapter"]))
+        if match is None:
+            entries.append((None, None, task, check))
+            continue
+        key, old = match
+        old_task, old_check = old.get("task", {}), bitset.encode_check(old.get("check", {}), old.get("task", {}))
+        merged = dict(old_task)
+        for kind in bitset.KINDS:
+            items = old_task.get(kind) or []
+            merged[kind] = items + [text for text in dict.fromkeys(task[kind]) if text not in items]
+        if any(len(merged[kind]) != len(old_task.get(kind) or []) for kind in bitset.KINDS):
+            merged, merged_check, _ = taskstore.edit_task(old_task, old_check, merged)
+        else:
+            merged, merged_check = old_task, dict(old_check)
+        for kind in bitset.KINDS:
+            done = {text for text, is_done in zip(task[kind], check[kind]) if is_done}
+            states = bitset.decode(merged_check.get(kind), len(merged[kind]))
+            merged_check[kind] = bitset.encode([state or text in done for state, text in zip(states, merged[kind])])
+        if merged is old_task and merged_check == old_check:
+            unchanged += 1
+        else:
+            entries.append((key, old, merged, merged_check))
+    return entries, unchanged
+
+
+def import_updates(entries, db_path, catalog_path=catalog.CATALOG_PATH, chunk_tasks=IMPORT_CHUNK_TASKS):
+    """Yields ``(records, values)`` per chunk of ``match_existing`` entries.
+
+    ``records`` maps each written key to its new ``{"task": ..., "check": ...}`` with the
+    checks encoded; ``values`` is the root-relative multi-path update that adds the new
+    chapters, changes just the merged fields of existing ones and moves their catalog counters.
+    """
+    for chunk in chunks(entries, chunk_tasks):
+        records, values, counters = {}, {}, []
+        for key, old, task, check in chunk:
+            check = bitset.encode_check(check, task)
+            if key is None:
+                key = str(uuid.uuid4())
+                values[f"{db_path}/{key}"] = {"task": task, "check": check}
+            else:
+                old_task, old_check = old.get("task", {}), old.get("check", {})
+                values.update({f"{db_path}/{key}/{path}": value for path, value in taskstore.edit_changes(old_task, old_check, task, check).items()})
+                counters.append(catalog.task_changes(old_task, old_check, -1, catalog_path))
+            records[key] = {"task": task, "check": check}
+            counters.append(catalog.task_changes(task, check, 1, catalog_path))
+        values.update(catalog.merge_changes(*counters))
+        yield records, values
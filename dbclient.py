@@ -0,0 +1,141 @@
+"""Database client with bounded concurrency, deadlines and retries.
+
+``DatabaseClient`` wraps a storage backend and runs every call on a small
+thread pool. The synchronous methods wait at most ``timeout`` seconds for an
+answer, so a slow database can no longer hold a script run indefinitely, and
+transient failures are retried with jittered exponential backoff inside that
+deadline. ``submit()`` returns the ``concurrent.futures.Future`` directly, so
+bulk operations can fan several writes out at once and the UI can wait on or
+poll them.
+
+Only errors that mean "try again" are retried: Firebase's ``UNAVAILABLE``,
+``DEADLINE_EXCEEDED``, ``INTERNAL`` and ``RESOURCE_EXHAUSTED`` codes and
+connection errors. An update carrying counter increments is not idempotent,
+so it is only retried when the request cannot have reached the database. A
+transaction re-reads the value before writing anyway, so it retries like a
+read.
+
+A synchronous call that times out before it started is cancelled and raises
+``TimeoutError``. One that was already running cannot be stopped and may
+still land, so it raises ``NotConfirmed`` carrying its future instead.
+
+Calls to Firebase all go through ``firebase_admin``'s cached database client,
+which keeps one pooled HTTP session per process; its own HTTP timeout is set
+to the same ``timeout`` in ``storage.initialize_firebase_app``. Configured
+from the ``[storage]`` table::
+
+    [storage]
+    db_workers = 4                  # concurrent database calls per process
+    db_timeout = 15                 # seconds before a call is given up
+    db_retries = 3                  # retries of a transient failure
+"""
+import concurrent.futures
+import contextvars
+import random
+import time
+
+from storage import StorageBackend, is_increment
+
+_RETRYABLE_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "RESOURCE_EXHAUSTED"}
+
+
+def is_transient(error, idempotent=True):
+    """Whether a failed call is worth retrying; non-idempotent writes only when they were never delivered."""
+    code = getattr(error, "code", None)  # firebase_admin.exceptions.FirebaseError
+    if code == "UNAVAILABLE" or isinstance(error, ConnectionRefusedError):
+        return True
+    return idempotent and (code in _RETRYABLE_CODES or isinstance(error, (ConnectionError, TimeoutError)))
+
+
+def _idempotent(method, args):
+    if method == "update":
+        return not any(is_increment(value) for value in args[0].values())
+    if method == "set":
+        return not is_increment(args[1])
+    return True
+
+
+class NotConfirmed(TimeoutError):
+    """A call that had already started when its deadline passed; it may still land.
+
+    ``future`` settles when the call finishes, so a caller can wait on it
+    instead of sending a non-idempotent write a second time.
+    """
+
+    def __init__(self, message, future):
+        super().__init__(message)
+        self.future = future
+
+
+class DatabaseClient(StorageBackend):
+    def __init__(self, backend, max_workers=4, timeout=15, retries=3, backoff=0.25, max_backoff=4):
+        self._backend = backend
+        self.name = backend.name
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="db")
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self.retried = 0  # attempts repeated after a transient failure, since start-up
+
+    def submit(self, method, *args):
+        """Runs ``backend.<method>(*args)`` on the pool; returns a Future for its result."""
+        # Run in a copy of the caller's context so the current trace (see metrics.py) follows the call.
+        return self._pool.submit(contextvars.copy_context().run, self._call, method, args, time.monotonic() + self._timeout)
+
+    def _call(self, method, args, deadline):
+        idempotent = _idempotent(method, args)
+        attempt = 0
+        while True:
+            try:
+                return getattr(self._backend, method)(*args)
+            except Exception as e:
+                attempt += 1
+                if attempt > self._retries or not is_transient(e, idempotent):
+                    raise
+                # Full jitter: a random wait up to the exponential step, so retrying sessions spread out.
+                delay = random.uniform(0, min(self._max_backoff, self._backoff * 2 ** attempt))
+                if time.monotonic() + delay > deadline:
+                    raise
+                self.retried += 1
+                time.sleep(delay)
+
+    def _wait(self, method, *args):
+        future = self.submit(method, *args)
+        try:
+            return future.result(timeout=self._timeout)
+        except concurrent.futures.TimeoutError:
+            if future.cancel():
+                raise TimeoutError(f"The database did not answer '{method}' within {self._timeout} s.") from None
+            raise NotConfirmed(f"The database has not confirmed '{method}' within {self._timeout} s; it may still be applied.", future) from None
+
+    def get(self, path):
+        return self._wait("get", path)
+
+    def get_with_etag(self, path):
+        return self._wait("get_with_etag", path)
+
+    def get_if_changed(self, path, etag):
+        return self._wait("get_if_changed", path, etag)
+
+    def query_equal(self, path, child, value):
+        return self._wait("query_equal", path, child, value)
+
+    def distinct_child_values(self, path, child):
+        return self._wait("distinct_child_values", path, child)
+
+    def set(self, path, value):
+        self._wait("set", path, value)
+
+    def delete(self, path):
+        self._wait("delete", path)
+
+    def update(self, values):
+        self._wait("update", values)
+
+    def transaction(self, path, update):
+        return self._wait("transaction", path, update)
+
+    def listen(self, path, callback):
+        # A long-lived stream with its own thread; nothing to bound here.
+        return self._backend.listen(path, callback)
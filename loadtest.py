@@ -0,0 +1,244 @@
+"""Concurrent-session load test for ``app.py``.
+
+Starts N ``streamlit.testing.v1.AppTest`` sessions in threads of one
+process (so they share ``st.cache_resource`` state the way sessions of one
+server do) against an in-memory database seeded with a synthetic tree in the
+default user's partition, and
+has each session repeat realistic actions with a think time in between:
+ticking checkboxes, searching, paging and starting/pausing the Pomodoro
+timer. Reports rerun latency percentiles per action, process CPU per
+session and database calls per minute.
+
+``AppTest.run()`` is not thread-safe: it installs and then clears the
+process-wide Streamlit runtime and swaps ``st.secrets`` around each run, so
+overlapping runs crash each other's script threads. Runs therefore take
+turns under a lock. The numbers are serialized reruns: a latency is one
+rerun's own time, without the wait for the lock, and the load is the
+sessions' combined rerun rate rather than true parallelism. A run that
+raised, or rendered nothing, is counted as an error and not as a latency::
+
+    python loadtest.py --sessions 20 --duration 60 --items 5000
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+import partitions
+import storage
+import synthetic
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+SEARCH_TERMS = ["cardiac", "renal", "receptor", "syn", "management", "blood supply"]
+# Action -> relative weight; ticks dominate real use.
+ACTIONS = {"tick": 6, "search": 2, "clear_search": 1, "page": 1, "timer": 1, "rerun": 1}
+_RUN_LOCK = threading.Lock()
+_DB_METHODS = ("get", "get_with_etag", "get_if_changed", "query_equal", "distinct_child_values", "set", "delete", "update")
+
+
+class DatabaseCallCounter:
+    """Counts calls on every ``MemoryBackend`` in the process (the app's database and the replicas' copies)."""
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def install(self, cls=storage.MemoryBackend):
+        counter = self
+        for name in _DB_METHODS:
+            original = self._originals[name] = getattr(cls, name)
+            def counted(backend, *args, _name=name, _original=original, **kwargs):
+                # Only the shared database counts; the replicas' internal MemoryBackends are local memory.
+                if getattr(backend, "_loadtest_db", False):
+                    with counter._lock:
+                        counter.calls[_name] += 1
+                return _original(backend, *args, **kwargs)
+            setattr(cls, name, counted)
+
+    def uninstall(self, cls=storage.MemoryBackend):
+        for name, original in self._originals.items():
+            setattr(cls, name, original)
+
+
+def _new_session(secrets):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    for table, values in secrets.items():
+        app.secrets[table] = values
+    return app
+
+
+def _act(app, action, rng):
+    """Performs one action; returns False if the page offered nothing to do it with."""
+    if action == "tick":
+        boxes = list(app.checkbox)
+        if not boxes:
+            return False
+        box = rng.choice(boxes)
+        box.set_value(not box.value)
+    elif action in ("search", "clear_search"):
+        box = [w for w in app.text_input if w.key == "search_input"]
+        if not box:
+            return False
+        box[0].input(rng.choice(SEARCH_TERMS) if action == "search" else "")
+    elif action == "page":
+        buttons = [b for b in app.button if b.key in ("task_page_next", "task_page_prev") and not b.disabled]
+        if not buttons:
+            return False
+        rng.choice(buttons).click()
+    elif action == "timer":
+        buttons = [b for b in app.button if b.key in ("pomodoro_start_btn", "pomodoro_pause_btn")]
+        if not buttons:
+            return False
+        buttons[0].click()
+    return True
+
+
+def _run(app):
+    """Reruns the app under the run lock; returns the rerun's time in ms, or an error message."""
+    with _RUN_LOCK:
+        started = time.perf_counter()
+        try:
+            app.run()
+        except Exception as e:
+            return str(e) or type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000
+    if app.exception:
+        return app.exception[0].message
+    if not app.main.children and not app.sidebar.children:
+        return "the run rendered nothing"
+    return elapsed
+
+
+def _session_loop(index, secrets, stop_at, think, seed, latencies, errors):
+    rng = random.Random(seed + index)
+    app = _new_session(secrets)
+    result = _run(app)
+    if isinstance(result, str):
+        errors.append(f"first_render: {result}")
+        return  # No page to act on.
+    latencies["first_render"].append(result)
+    names, weights = list(ACTIONS), list(ACTIONS.values())
+    while time.time() < stop_at:
+        time.sleep(rng.uniform(0.5, 1.5) * think)
+        action = rng.choices(names, weights)[0]
+        try:
+            if not _act(app, action, rng):
+                continue
+        except Exception as e:
+            errors.append(f"{action}: {e}")
+            continue
+        result = _run(app)
+        if isinstance(result, str):
+            errors.append(f"{action}: {result}")
+        else:
+            latencies[action].append(result)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load_test(sessions=10, duration=30, think=1.0, items=2000, seed=0):
+    from streamlit.testing.v1.util import patch_config_options
+
+    tree = synthetic.generate_tree(items, seed=seed, user=partitions.DEFAULT_USER)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fh:
+        json.dump(tree, fh)
+        seed_path = fh.name
+    secrets = {"storage": {"backend": "memory", "seed_path": seed_path}}
+
+    # The app builds its database through create_backend; tag it so its calls are counted.
+    counter = DatabaseCallCounter()
+    original_create = storage.create_backend
+    def create_backend(config=None):
+        backend = original_create(config)
+        backend._loadtest_db = True
+        return backend
+    storage.create_backend = create_backend
+    counter.install()
+
+    latencies, errors = collections.defaultdict(list), []
+    cpu_started, wall_started = time.process_time(), time.time()
+    stop_at = wall_started + duration
+    threads = [
+        threading.Thread(target=_session_loop, args=(i, secrets, stop_at, think, seed, latencies, errors), daemon=True)
+        for i in range(sessions)
+    ]
+    try:
+        # Runs are serialized by _RUN_LOCK (see the module docstring); keeping global.appTest on
+        # for the whole test also covers work a finished run left on other threads.
+        with patch_config_options({"global.appTest": True}):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        counter.uninstall()
+        storage.create_backend = original_create
+        os.unlink(seed_path)
+    wall = time.time() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    actions = {
+        action: {
+            "count": len(values), "p50_ms": round(_percentile(values, 50), 1), "p90_ms": round(_percentile(values, 90), 1),
+            "p99_ms": round(_percentile(values, 99), 1), "max_ms": round(max(values), 1), "mean_ms": round(statistics.mean(values), 1),
+        }
+        for action, values in sorted(latencies.items()) if values
+    }
+    reruns = [v for action, values in latencies.items() if action != "first_render" for v in values]
+    return {
+        "sessions": sessions, "duration_s": round(wall, 1), "items": synthetic.count_items(tree[partitions.USERS_PATH][partitions.DEFAULT_USER]["tasks"]),
+        "actions": actions,
+        "rerun_p50_ms": round(_percentile(reruns, 50), 1) if reruns else None,
+        "rerun_p99_ms": round(_percentile(reruns, 99), 1) if reruns else None,
+        "cpu_s": round(cpu, 2),
+        # Fraction of one core each session kept busy; 1 / this is a rough sessions-per-core ceiling.
+        "cpu_per_session": round(cpu / wall / sessions, 4),
+        "db_calls_per_min": round(sum(counter.calls.values()) / wall * 60, 1),
+        "db_calls": dict(counter.calls),
+        "error_count": len(errors),
+        "errors": errors[:20],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between a session's actions")
+    parser.add_argument("--items", type=int, default=2000, help="SN/LAQ items in the synthetic database")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="append the report as one JSON line to this file")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(args.sessions, args.duration, args.think, args.items, args.seed)
+    print(f"{report['sessions']} sessions for {report['duration_s']} s on {report['items']} items")
+    print(f"{'action':<14}{'count':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for action, stats in report["actions"].items():
+        print(f"{action:<14}{stats['count']:>7}{stats['p50_ms']:>9}{stats['p90_ms']:>9}{stats['p99_ms']:>9}{stats['max_ms']:>9}")
+    print(f"Rerun latency (reruns serialized): p50 {report['rerun_p50_ms']} ms, p99 {report['rerun_p99_ms']} ms")
+    cpu_per_session = report["cpu_per_session"]
+    ceiling = f", about {int(1 / cpu_per_session)} sessions per core" if cpu_per_session else ""
+    print(f"CPU: {report['cpu_s']} s total, {cpu_per_session * 100:.2f}% of a core per session{ceiling}")
+    print(f"Database calls: {report['db_calls_per_min']}/min {report['db_calls']}")
+    if report["errors"]:
+        print(f"Errors: {report['error_count']} ({len(report['errors'])} shown):")
+        for error in report["errors"]:
+            print(f"  {error}")
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
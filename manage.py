@@ -0,0 +1,185 @@
+"""Maintenance commands for the Study Tracker database.
+
+Uses the same ``.streamlit/secrets.toml`` as the app, so it talks to whichever
+backend the ``[storage]`` table selects::
+
+    python manage.py [--user NAME] rebuild-catalog
+    python manage.py [--user NAME] encode-checks [--dry-run]
+    python manage.py --user NAME partition-users [--keep-flat]
+    python manage.py profile-startup [--json startup.jsonl]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+import tomllib
+
+import bitset
+import catalog
+import dataio
+import partitions
+import storage
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+# Heavy packages whose presence after a first render is worth tracking. pandas is only meant to load on
+# export/import; pyarrow comes with Streamlit's custom component API; firebase_admin with the Firebase backend.
+HEAVY_MODULES = ("pandas", "pyarrow", "numpy", "firebase_admin")
+
+
+def load_backend(secrets_path):
+    with open(secrets_path, "rb") as fh:
+        secrets = tomllib.load(fh)
+    storage_config = secrets.get("storage", {})
+    if storage_config.get("backend", "firebase") == "firebase":
+        storage.initialize_firebase_app(secrets["firebase"])
+    return storage.create_backend(storage_config)
+
+
+def rebuild_catalog(backend, args):
+    """Recomputes every subject's counters from a user's tasks."""
+    built = catalog.build_catalog(backend.get(partitions.tasks_path(args.user)))
+    backend.set(partitions.catalog_path(args.user), built)
+    print(f"Rebuilt catalog for {len(built)} subject(s) of user '{args.user}'.")
+
+
+def encode_checks(backend, args):
+    """Rewrites SN/LAQ ticks stored as boolean lists in the compact bitset encoding."""
+    db_path = partitions.tasks_path(args.user)
+    tasks = backend.get(db_path) or {}
+    legacy = [(key, value) for key, value in tasks.items() if bitset.needs_encoding(value.get("check"))]
+    before = after = 0
+    for chunk in dataio.chunks(legacy, args.chunk):
+        values = {}
+        for key, value in chunk:
+            encoded = bitset.encode_check(value.get("check"), value.get("task", {}))
+            before += len(json.dumps(value.get("check")))
+            after += len(json.dumps(encoded))
+            values.update({f"{db_path}/{key}/check/{kind}": states for kind, states in encoded.items()})
+        if not args.dry_run:
+            backend.update(values)
+    action = "Would encode" if args.dry_run else "Encoded"
+    print(f"{action} the checks of {len(legacy)} of {len(tasks)} task(s): {before:,} -> {after:,} bytes of JSON.")
+
+
+def partition_users(backend, args):
+    """Moves a tree from before per-user partitions (root ``tasks``/``subjects``) under one user."""
+    tasks = backend.get(partitions.FLAT_TASKS_PATH) or {}
+    if not tasks:
+        print("No tasks at the root of the database; nothing to move.")
+        return
+    db_path = partitions.tasks_path(args.user)
+    for chunk in dataio.chunks(list(tasks.items()), args.chunk):
+        backend.update({f"{db_path}/{key}": value for key, value in chunk})
+    # Built from the whole partition, in case the user already had tasks there.
+    built = catalog.build_catalog(backend.get(db_path))
+    backend.set(partitions.catalog_path(args.user), built)
+    if not args.keep_flat:
+        backend.update({partitions.FLAT_TASKS_PATH: None, partitions.FLAT_CATALOG_PATH: None})
+    print(f"Moved {len(tasks)} task(s) to {db_path}; catalog rebuilt for {len(built)} subject(s).")
+
+
+def _app_imports():
+    with open(APP_PATH, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def _import_profile(modules):
+    """Cumulative import time (ms) per top-level module, from ``python -X importtime`` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {m}" for m in modules)],
+        capture_output=True, text=True, cwd=os.path.dirname(APP_PATH),
+    )
+    totals = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.rstrip()
+        if name[1:] == name.lstrip():  # top-level entries only; nested ones are included in their parents
+            totals[name.strip()] = int(cumulative) / 1000
+    return totals
+
+
+def _session_profile(secrets):
+    """Wall time of the first render in a cold process and of a new session in the warmed-up process."""
+    from streamlit.testing.v1 import AppTest
+
+    timings = {}
+    for label in ("cold_session_ms", "warm_session_ms"):
+        app = AppTest.from_file(APP_PATH, default_timeout=120)
+        for table, values in secrets.items():
+            app.secrets[table] = values
+        started = time.perf_counter()
+        app.run()
+        timings[label] = round((time.perf_counter() - started) * 1000, 1)
+        if app.exception:
+            raise SystemExit(f"App raised during {label}: {app.exception[0].message}")
+    timings["heavy_modules_loaded"] = sorted(m for m in HEAVY_MODULES if m in sys.modules)
+    return timings
+
+
+def profile_startup(backend, args):
+    """Reports import and first-render cost of the app, for tracking cold starts."""
+    modules = _app_imports()
+    roots = {module.split(".")[0] for module in modules}
+    # Interpreter start-up (site, encodings, ...) also shows up top-level; only the app's own imports count.
+    imports = {name: ms for name, ms in _import_profile(modules).items() if name.split(".")[0] in roots}
+    with open(args.secrets, "rb") as fh:
+        secrets = tomllib.load(fh)
+    if args.backend:
+        secrets["storage"] = {**secrets.get("storage", {}), "backend": args.backend}
+    report = {
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "backend": secrets.get("storage", {}).get("backend", "firebase"),
+        "import_ms": round(sum(imports.values()), 1),
+        "slowest_imports": dict(sorted(imports.items(), key=lambda item: -item[1])[:args.top]),
+        **_session_profile(secrets),
+    }
+    print(f"App imports:        {report['import_ms']:8.1f} ms ({report['backend']} backend)")
+    for name, ms in report["slowest_imports"].items():
+        print(f"  {name:<24}{ms:8.1f} ms")
+    print(f"Cold session:       {report['cold_session_ms']:8.1f} ms (process start, caches empty)")
+    print(f"Warm session:       {report['warm_session_ms']:8.1f} ms (new session, caches filled)")
+    print(f"Heavy modules after a render: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(report) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="path to the app's secrets.toml")
+    parser.add_argument("--user", type=partitions.normalize_user, default=partitions.DEFAULT_USER, help="whose partition to work on")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-catalog", help=rebuild_catalog.__doc__).set_defaults(func=rebuild_catalog)
+    encode = commands.add_parser("encode-checks", help=encode_checks.__doc__)
+    encode.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    encode.add_argument("--chunk", type=int, default=500, help="tasks per multi-path update")
+    encode.set_defaults(func=encode_checks)
+    partition = commands.add_parser("partition-users", help=partition_users.__doc__)
+    partition.add_argument("--keep-flat", action="store_true", help="leave the root tasks and catalog in place")
+    partition.add_argument("--chunk", type=int, default=500, help="tasks per multi-path update")
+    partition.set_defaults(func=partition_users)
+    profile = commands.add_parser("profile-startup", help=profile_startup.__doc__)
+    profile.add_argument("--backend", help="override [storage] backend, e.g. memory to leave the database out")
+    profile.add_argument("--top", type=int, default=8, help="how many of the slowest imports to list")
+    profile.add_argument("--json", help="append the report as one JSON line to this file")
+    profile.set_defaults(func=profile_startup, needs_backend=False)
+    args = parser.parse_args(argv)
+    args.func(load_backend(args.secrets) if getattr(args, "needs_backend", True) else None, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Timing spans and counters for the app's hot paths.
+
+``Metrics`` keeps process-wide totals: for each span name (``task_list_section``,
+``db.get``, ``load_tasks``...) a count, total and maximum duration, and plain
+counters such as bytes read from and written to the database or ``load_tasks``
+cache hits and misses. A full script run can also be traced on its own
+(``begin_rerun``/``end_rerun``), which is what the debug sidebar panel shows.
+
+``InstrumentedBackend`` wraps a storage backend and times every call, and
+``MetricsExporter`` writes the totals from a background thread to either a
+size-rotated JSON Lines file or a Prometheus text-format file (for
+node_exporter's textfile collector). Configured from ``.streamlit/secrets.toml``::
+
+    [metrics]
+    debug_panel = true              # per-rerun timings in the sidebar
+    export_path = "metrics.jsonl"   # or "study_tracker.prom" with export_format = "prometheus"
+    export_format = "jsonl"         # "jsonl" or "prometheus"
+    export_interval = 60            # seconds between writes
+    max_bytes = 5_000_000           # jsonl: rotate to metrics.jsonl.1 .. .<backups> past this size
+    backups = 3
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+from storage import StorageBackend
+
+EXPORT_FORMATS = ("jsonl", "prometheus")
+_PROMETHEUS_PREFIX = "study_tracker"
+_current_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _size(value):
+    # Rough payload size: the JSON the database would send or receive.
+    return len(json.dumps(value, separators=(",", ":"))) if value is not None else 0
+
+
+class RerunTrace:
+    """Spans and counters recorded by one script run, in the order they finished."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.spans = []  # (name, seconds)
+        self.counters = {}
+        self.duration = None
+
+    def totals(self):
+        """Returns ``{name: (count, seconds)}`` with the slowest spans first."""
+        out = {}
+        for name, seconds in self.spans:
+            count, total = out.get(name, (0, 0.0))
+            out[name] = (count + 1, total + seconds)
+        return dict(sorted(out.items(), key=lambda item: -item[1][1]))
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}  # name -> [count, total seconds, max seconds]
+        self._counters = {}
+        self.started_at = time.time()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                self._spans[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((name, seconds))
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.counters[name] = trace.counters.get(name, 0) + amount
+
+    @contextlib.contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def begin_rerun(self):
+        """Starts tracing a script run in this thread; returns the ``RerunTrace`` it fills.
+
+        A run cut short by ``st.rerun()``/``st.stop()`` never reaches ``end_rerun``; the
+        next ``begin_rerun`` simply replaces its trace.
+        """
+        trace = RerunTrace()
+        _current_trace.set(trace)
+        return trace
+
+    def end_rerun(self, trace):
+        _current_trace.set(None)
+        trace.duration = time.perf_counter() - trace._started
+        self.observe("rerun", trace.duration)
+        return trace
+
+    def snapshot(self):
+        """Totals since the process started: ``{"spans": {name: {...}}, "counters": {...}}``."""
+        with self._lock:
+            spans = {
+                name: {"count": count, "total_ms": round(total * 1000, 3), "max_ms": round(peak * 1000, 3)}
+                for name, (count, total, peak) in sorted(self._spans.items())
+            }
+            counters = dict(sorted(self._counters.items()))
+        return {"spans": spans, "counters": counters}
+
+
+class InstrumentedBackend(StorageBackend):
+    """Times every call on ``backend`` as a ``db.<method>`` span and counts the bytes moved."""
+
+    def __init__(self, backend, metrics):
+        self._backend = backend
+        self._metrics = metrics
+        self.name = backend.name
+
+    def _read(self, method, *args):
+        with self._metrics.span(f"db.{method}"):
+            result = getattr(self._backend, method)(*args)
+        self._metrics.inc("db_calls")
+        return result
+
+    def _write(self, method, payload, *args):
+        with self._metrics.span(f"db.{method}"):
+            getattr(self._backend, method)(*args)
+        self._metrics.inc("db_calls")
+        self._metrics.inc("db_bytes_written", _size(payload))
+
+    def get(self, path):
+        value = self._read("get", path)
+        self._metrics.inc("db_bytes_read", _size(value))
+        return value
+
+    def get_with_etag(self, path):
+        value, etag = self._read("get_with_etag", path)
+        self._metrics.inc("db_bytes_read", _size(value))
+        return value, etag
+
+    def get_if_changed(self, path, etag):
+        changed, value, new_etag = self._read("get_if_changed", path, etag)
+        self._metrics.inc("db_bytes_read", _size(value))
+        return changed, value, new_etag
+
+    def query_equal(self, path, child, value):
+        matches = self._read("query_equal", path, child, value)
+        self._metrics.inc("db_bytes_read", _size(matches))
+        return matches
+
+    def distinct_child_values(self, path, child):
+        values = self._read("distinct_child_values", path, child)
+        self._metrics.inc("db_bytes_read", _size(values))
+        return values
+
+    def set(self, path, value):
+        self._write("set", value, path, value)
+
+    def delete(self, path):
+        self._write("delete", None, path)
+
+    def update(self, values):
+        self._write("update", values, values)
+
+    def transaction(self, path, update):
+        value = self._read("transaction", path, update)
+        self._metrics.inc("db_bytes_written", _size(value))
+        return value
+
+    def listen(self, path, callback):
+        def counted(event_type, rel_path, data):
+            self._metrics.inc("db_stream_events")
+            self._metrics.inc("db_bytes_read", _size(data))
+            callback(event_type, rel_path, data)
+        return self._backend.listen(path, counted)
+
+    def __getattr__(self, name):
+        # Backend-specific extras (e.g. a SQLite connection) pass straight through.
+        return getattr(self._backend, name)
+
+
+def prometheus_text(snapshot):
+    """Renders a ``Metrics.snapshot()`` in the Prometheus text exposition format."""
+    prefix = _PROMETHEUS_PREFIX
+    lines = [
+        f"# HELP {prefix}_span_seconds Time spent in app sections and database calls.",
+        f"# TYPE {prefix}_span_seconds summary",
+    ]
+    for name, stats in snapshot["spans"].items():
+        lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {stats["count"]}')
+        lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {stats["total_ms"] / 1000:.6f}')
+    lines += [f"# HELP {prefix}_span_max_seconds Slowest single span since the process started.", f"# TYPE {prefix}_span_max_seconds gauge"]
+    for name, stats in snapshot["spans"].items():
+        lines.append(f'{prefix}_span_max_seconds{{span="{name}"}} {stats["max_ms"] / 1000:.6f}')
+    for name, value in snapshot["counters"].items():
+        lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Writes ``metrics.snapshot()`` to ``path`` every ``interval`` seconds from a daemon thread.
+
+    JSON Lines appends one line per write and rotates the file past ``max_bytes``;
+    Prometheus text replaces the file atomically each time.
+    """
+
+    def __init__(self, metrics, path, fmt="jsonl", interval=60, max_bytes=5_000_000, backups=3):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown metrics export format '{fmt}'. Use 'jsonl' or 'prometheus'.")
+        self._metrics = metrics
+        self._path = path
+        self._fmt = fmt
+        self._interval = interval
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+        self._thread.start()
+
+    def _rotate(self):
+        for i in range(self._backups - 1, 0, -1):
+            if os.path.exists(f"{self._path}.{i}"):
+                os.replace(f"{self._path}.{i}", f"{self._path}.{i + 1}")
+        if self._backups:
+            os.replace(self._path, f"{self._path}.1")
+        else:
+            os.remove(self._path)
+
+    def write_once(self):
+        snapshot = self._metrics.snapshot()
+        if self._fmt == "prometheus":
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(prometheus_text(snapshot))
+            os.replace(tmp_path, self._path)
+            return
+        line = json.dumps({
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "pid": os.getpid(),
+            "uptime_s": round(time.time() - self._metrics.started_at, 1), **snapshot,
+        }) + "\n"
+        if os.path.exists(self._path) and os.path.getsize(self._path) + len(line) > self._max_bytes:
+            self._rotate()
+        with open(self._path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.write_once()
+                self.last_error = None
+            except OSError as e:
+                self.last_error = str(e)
@@ -0,0 +1,218 @@
+"""Offline-first wrapper around a remote storage backend.
+
+``OfflineBackend`` answers every read from an on-disk SQLite snapshot of the
+synced paths, so a new process renders from disk without waiting on the
+database. Writes land in the snapshot at once and are appended to an outbox
+in the same transaction; a background thread replays the outbox to the
+remote backend in order and, once it is empty, reconciles the snapshot with
+the remote tree using ETags (a bodiless 304 when nothing changed). While the
+remote is unreachable the app keeps working against the snapshot and the
+outbox simply grows.
+
+An entry is only dropped once its write succeeded and only sent again once
+it failed: the replay waits on the write's own future rather than on a
+deadline, because a write that outlived one may still land, and entries
+carry counter increments that must not be applied twice.
+
+Enabled from ``.streamlit/secrets.toml``::
+
+    [storage]
+    offline_cache = "study_tracker_cache.db"
+    sync_interval = 30              # seconds between reconciles
+"""
+import json
+import threading
+import time
+
+from storage import StorageBackend, SQLiteBackend, _to_tree, join_path
+
+# Bump when the snapshot layout changes; an older snapshot is discarded and pulled again.
+SNAPSHOT_VERSION = 1
+_RETRY_MAX_SECS = 300
+
+
+class SnapshotCache(SQLiteBackend):
+    """The SQLite leaf table plus an outbox of pending writes and per-path sync metadata."""
+
+    name = "snapshot"
+
+    def __init__(self, path):
+        super().__init__(path)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS outbox (seq INTEGER PRIMARY KEY AUTOINCREMENT, values_json TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            if self.meta("snapshot_version") != SNAPSHOT_VERSION:
+                self._conn.execute("DELETE FROM nodes")
+                self._conn.execute("DELETE FROM meta")
+                self.set_meta("snapshot_version", SNAPSHOT_VERSION)
+
+    def meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def update_and_queue(self, values):
+        """Applies a multi-path update locally and queues the original values for the remote."""
+        with self._lock:
+            resolved = self._resolve_increments(values)
+            with self._conn:
+                for path, value in resolved.items():
+                    self._write(join_path(path), _to_tree(value))
+                self._conn.execute("INSERT INTO outbox (values_json) VALUES (?)", (json.dumps(values),))
+            self._notify(resolved)
+
+    def transaction_and_queue(self, path, update):
+        """Applies ``update`` to the local value atomically and queues the result for the remote."""
+        with self._lock:
+            value = update(self.get(path))
+            self.update_and_queue({path: value})
+            return value
+
+    def outbox(self, limit=50):
+        with self._lock:
+            rows = self._conn.execute("SELECT seq, values_json FROM outbox ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        return [(seq, json.loads(raw)) for seq, raw in rows]
+
+    def outbox_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def drop_outbox(self, seq):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+
+    def replace_if_idle(self, path, value, etag):
+        """Stores a remote copy of ``path`` unless local writes are still waiting to be replayed."""
+        with self._lock:
+            if self.outbox_count():
+                return False
+            if self.get(path) != value:
+                with self._conn:
+                    self._write(join_path(path), _to_tree(value))
+                self._notify({path: value})
+            self.set_meta(f"etag:{join_path(path)}", etag)
+            return True
+
+
+class OfflineBackend(StorageBackend):
+    """Reads and writes the local snapshot; syncs with ``remote`` from a background thread."""
+
+    name = "offline"
+
+    def __init__(self, remote, cache_path, paths, sync_interval=30):
+        self._remote = remote
+        self._cache = SnapshotCache(cache_path)
+        self._paths = [join_path(path) for path in paths]
+        self._sync_interval = sync_interval
+        self._wake = threading.Event()
+        self._sync_lock = threading.Lock()  # one replay at a time, so an entry is never in flight twice
+        self.online = None  # unknown until the first sync attempt
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="offline-sync", daemon=True)
+        self._thread.start()
+
+    # --- Reads: always the snapshot ---
+    def get(self, path):
+        return self._cache.get(path)
+
+    def query_equal(self, path, child, value):
+        return self._cache.query_equal(path, child, value)
+
+    def distinct_child_values(self, path, child):
+        return self._cache.distinct_child_values(path, child)
+
+    def listen(self, path, callback):
+        # Remote changes reach listeners when the reconcile writes them into the snapshot.
+        return self._cache.listen(path, callback)
+
+    # --- Writes: snapshot + outbox ---
+    def set(self, path, value):
+        self.update({path: value})
+
+    def delete(self, path):
+        self.update({path: None})
+
+    def update(self, values):
+        if values:
+            self._cache.update_and_queue(values)
+            self._wake.set()
+
+    def transaction(self, path, update):
+        # Atomic against this process's snapshot; the result reaches the remote as a plain write,
+        # so two devices editing the same list while offline still resolve last-writer-wins.
+        value = self._cache.transaction_and_queue(path, update)
+        self._wake.set()
+        return value
+
+    # --- Sync status ---
+    @property
+    def pending_count(self):
+        return self._cache.outbox_count()
+
+    @property
+    def synced_at(self):
+        return self._cache.meta("synced_at")
+
+    @property
+    def has_snapshot(self):
+        return self.synced_at is not None
+
+    def sync_now(self):
+        self._wake.set()
+
+    def track(self, path):
+        """Adds ``path`` to the subtrees kept in the snapshot and syncs it right away."""
+        path = join_path(path)
+        if path not in self._paths:
+            self._paths.append(path)
+            self._wake.set()
+
+    # --- Background sync ---
+    def _replay(self):
+        while True:
+            batch = self._cache.outbox()
+            if not batch:
+                return
+            for seq, values in batch:
+                # result() without a timeout: the remote's own deadline ends the call, and until it has
+                # ended the write may still land.
+                self._remote.submit("update", values).result()
+                self._cache.drop_outbox(seq)
+
+    def _reconcile(self):
+        for path in list(self._paths):
+            etag = self._cache.meta(f"etag:{path}")
+            if etag is not None:
+                changed, data, etag = self._remote.get_if_changed(path, etag)
+                if not changed:
+                    continue
+            else:
+                data, etag = self._remote.get_with_etag(path)
+            if not self._cache.replace_if_idle(path, data, etag):
+                return  # New local writes arrived meanwhile; they are replayed first on the next pass.
+        self._cache.set_meta("synced_at", time.time())
+
+    def sync_once(self):
+        """One replay-then-reconcile pass; returns False (and keeps the outbox) if the remote failed."""
+        with self._sync_lock:
+            try:
+                self._replay()
+                self._reconcile()
+            except Exception as e:
+                self.online, self.last_error = False, str(e)
+                return False
+            self.online, self.last_error = True, None
+            return True
+
+    def _run(self):
+        delay = self._sync_interval
+        while True:
+            ok = self.sync_once()
+            # Back off while offline, but a new local write still wakes the loop at once.
+            delay = self._sync_interval if ok else min(max(delay * 2, 5), _RETRY_MAX_SECS)
+            self._wake.wait(delay)
+            self._wake.clear()
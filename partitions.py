@@ -0,0 +1,37 @@
+"""Per-user partitions of the database tree.
+
+Every user's tasks and subject catalog live under their own node::
+
+    users/<uid>/tasks/<key>: {"task": ..., "check": ...}
+    users/<uid>/subjects/<subject key>: {"name": ..., "tasks": ..., "done": ..., "total": ...}
+
+so a session only ever reads, caches and listens to one user's data. The
+user is a local identity, not authentication: ``?user=<name>`` in the URL
+(remembered for the session), or ``default_user`` from the ``[storage]``
+table. Trees written before partitioning keep ``tasks`` and ``subjects`` at
+the root; ``python manage.py partition-users`` moves them into a partition.
+"""
+import catalog
+
+USERS_PATH = "users"
+DEFAULT_USER = "default"
+FLAT_TASKS_PATH = "tasks"
+FLAT_CATALOG_PATH = catalog.CATALOG_PATH
+
+
+def normalize_user(name):
+    """The partition key for a user name: trimmed, lower-cased, with Firebase's forbidden key characters escaped."""
+    name = (name or "").strip().lower()
+    return catalog.escape_key(name) if name else None
+
+
+def user_root(uid):
+    return f"{USERS_PATH}/{uid}"
+
+
+def tasks_path(uid):
+    return f"{user_root(uid)}/tasks"
+
+
+def catalog_path(uid):
+    return f"{user_root(uid)}/{catalog.CATALOG_PATH}"
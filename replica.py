@@ -0,0 +1,224 @@
+"""Process-wide copy of the task tree shared by every session.
+
+Writes made by the app are applied to the copy in place, so a change to one
+task never forces a full re-download or evicts the data other sessions use.
+In live mode the copy subscribes to the backend's change stream (Firebase's
+``listen()``), so edits from other devices arrive as small put/patch events
+and the tree is never polled. Without a listener the copy is revalidated
+with the node's ETag, so an unchanged tree is never downloaded again.
+
+With ``lazy_subjects`` (and no listener) only the subjects someone actually
+views are fetched, each with an indexed ``order_by_child("task/Subject")``
+query. Queries cannot be revalidated by ETag, so the lazy copy revalidates
+the small subject catalog instead (see ``catalog.py``): while its ETag holds
+nothing is fetched, and otherwise only loaded subjects whose catalog entry
+moved are queried again. The subject list comes from the catalog as well.
+
+``version`` only moves when the copy's data changes, and the keys each
+version touched are logged, so a session can patch just those tasks with
+``changes_since()`` instead of rebuilding everything it loaded.
+"""
+import collections
+import threading
+import time
+
+import catalog
+from storage import MemoryBackend, is_increment, join_path, split_path
+
+SUBJECT_FIELD = "task/Subject"
+_CHANGE_LOG = 1000  # versions whose changed keys are remembered; a session further behind reloads in full
+
+
+def _by_key(node):
+    # A node whose keys are all small integers reads back as a list.
+    if isinstance(node, list):
+        return {str(i): value for i, value in enumerate(node) if value is not None}
+    return node or {}
+
+
+class TaskReplica:
+    def __init__(self, backend, path, ttl=300, lazy_subjects=False, catalog_path=catalog.CATALOG_PATH):
+        self._backend = backend
+        self._path = join_path(path)
+        self._ttl = ttl
+        self._lazy = lazy_subjects
+        self._catalog_path = catalog_path
+        self._catalog = None  # catalog node the lazily loaded subjects were last checked against
+        self._catalog_etag = None
+        self._loaded_subjects = set()
+        self._subject_names = set()
+        self._lock = threading.Lock()
+        self._store = MemoryBackend()
+        self._listener = None
+        self._ready = threading.Event()
+        self._etag = None
+        self.loaded_at = None
+        self.version = 0
+        self._changes = collections.deque(maxlen=_CHANGE_LOG)  # (version, changed keys, or None for "everything")
+
+    @property
+    def is_live(self):
+        return self._listener is not None
+
+    @property
+    def is_lazy(self):
+        return self._lazy and not self.is_live
+
+    @property
+    def is_stale(self):
+        if self.is_live:
+            return not self._ready.is_set()
+        return self.loaded_at is None or time.time() - self.loaded_at > self._ttl
+
+    def start_listening(self):
+        """Subscribes to the backend; returns False (and keeps TTL reloads) if that fails."""
+        if self._listener is None:
+            try:
+                self._listener = self._backend.listen(self._path, self._on_event)
+            except Exception:
+                self._listener = None
+        return self._listener is not None
+
+    def stop_listening(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def _changed(self, keys):
+        # Called with the lock held, after the store changed.
+        self.version += 1
+        self._changes.append((self.version, set(keys) if keys is not None else None))
+
+    def _on_event(self, event_type, path, data):
+        with self._lock:
+            if event_type == "put":
+                self._store.set(path, data)
+                keys = split_path(path)[:1] or None
+            elif event_type == "patch":
+                values = {join_path(path, rel): value for rel, value in (data or {}).items()}
+                self._store.update(values)
+                keys = {split_path(rel)[0] for rel in values if split_path(rel)}
+            else:
+                return
+            self.loaded_at = time.time()
+            self._changed(keys)
+        self._ready.set()
+
+    def changes_since(self, version):
+        """Returns ``(current version, keys changed after version)``; the keys are None if they are no longer known."""
+        with self._lock:
+            if version == self.version:
+                return self.version, set()
+            if not self._changes or self._changes[0][0] > version + 1:
+                return self.version, None
+            keys = set()
+            for logged, changed in self._changes:
+                if logged > version:
+                    if changed is None:
+                        return self.version, None
+                    keys |= changed
+            return self.version, keys
+
+    def values(self, keys):
+        """The copy's current value of each task key (None if it is gone or not loaded)."""
+        with self._lock:
+            return {key: self._store.get(key) for key in keys}
+
+    def refresh(self, timeout=30):
+        if self.is_live:
+            # The listener's first event carries the whole tree.
+            self._ready.wait(timeout)
+            return
+        if self.is_lazy:
+            self._revalidate_subjects()
+            return
+        if self._etag is not None:
+            changed, data, etag = self._backend.get_if_changed(self._path, self._etag)
+            if not changed:
+                self.loaded_at = time.time()
+                return
+        else:
+            data, etag = self._backend.get_with_etag(self._path)
+        with self._lock:
+            old, data = _by_key(self._store.get("")), _by_key(data)
+            # A new ETag can come from this process's own writes, which the copy already has; log only real differences.
+            changed = {key for key in old.keys() | data.keys() if old.get(key) != data.get(key)}
+            self._store.set("", data)
+            self._etag = etag
+            self.loaded_at = time.time()
+            if changed:
+                self._changed(changed)
+
+    def _revalidate_subjects(self):
+        if self._catalog is not None:
+            changed, node, etag = self._backend.get_if_changed(self._catalog_path, self._catalog_etag)
+            if not changed:
+                self.loaded_at = time.time()
+                return
+        else:
+            node, etag = self._backend.get_with_etag(self._catalog_path)
+        old, new = catalog.subjects_in(self._catalog), catalog.subjects_in(node)
+        for subject in list(self._loaded_subjects):
+            if self._catalog is None or old.get(subject) != new.get(subject):
+                self._load_subject(subject)
+        with self._lock:
+            self._subject_names = set(new)
+            self._catalog, self._catalog_etag = node or {}, etag
+            self.loaded_at = time.time()
+
+    def snapshot(self):
+        """Returns a private copy of ``{key: {"task": ..., "check": ...}}``.
+
+        In lazy mode this only covers the subjects loaded so far.
+        """
+        if self.is_stale:
+            self.refresh()
+        return self._store.get("") or {}
+
+    def _load_subject(self, subject):
+        data = self._backend.query_equal(self._path, SUBJECT_FIELD, subject)
+        with self._lock:
+            old = self._store.query_equal("", SUBJECT_FIELD, subject)
+            changes = {key: None for key in old if key not in data}
+            changes.update({key: value for key, value in data.items() if old.get(key) != value})
+            self._loaded_subjects.add(subject)
+            self._subject_names.add(subject)
+            if changes:
+                self._store.update(changes)
+                self._changed(changes)
+
+    def has_subject(self, subject):
+        """Whether ``subject_snapshot(subject)`` can be answered without a database call."""
+        return not self.is_stale and (not self.is_lazy or subject in self._loaded_subjects)
+
+    def subject_snapshot(self, subject):
+        """Like ``snapshot()`` but only for one subject; lazily fetches it the first time."""
+        if self.is_stale:
+            self.refresh()
+        if self.is_lazy and subject not in self._loaded_subjects:
+            self._load_subject(subject)
+        return self._store.query_equal("", SUBJECT_FIELD, subject)
+
+    def subjects(self):
+        if self.is_stale:
+            self.refresh()
+        if self.is_lazy:
+            with self._lock:
+                return set(self._subject_names)
+        return set(self._store.distinct_child_values("", SUBJECT_FIELD))
+
+    def apply(self, values):
+        """Mirrors a write the app just made; paths are relative to the database root."""
+        prefix = split_path(self._path)
+        local = {}
+        for path, value in values.items():
+            parts = split_path(path)
+            # A live copy gets the server's resolved counters from the stream; adding them here would count twice.
+            if parts[:len(prefix)] == prefix and not (self.is_live and is_increment(value)):
+                local["/".join(parts[len(prefix):])] = value
+        if local:
+            with self._lock:
+                self._store.update(local)
+                if self.is_lazy:
+                    self._subject_names.update(self._store.distinct_child_values("", SUBJECT_FIELD))
+                self._changed(None if "" in local else {split_path(path)[0] for path in local})
@@ -0,0 +1,104 @@
+"""Incremental n-gram index over the searchable text of tasks.
+
+Every chapter title and SN/LAQ item is lowercased once and its 1-, 2- and
+3-character grams are posted to an inverted index. A query of up to three
+characters is a single posting lookup; a longer one intersects the postings
+of its trigrams (rarest first) and confirms the few survivors with a real
+substring check. The index is updated per task on add, edit and delete, so a
+search costs roughly the same however large the question bank grows.
+"""
+_GRAM = 3
+
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _all_grams(text):
+    grams = set()
+    for size in range(1, _GRAM + 1):
+        grams |= _grams(text, size)
+    return grams
+
+
+def _word_starts(text):
+    return [i for i, ch in enumerate(text) if ch.isalnum() and (i == 0 or not text[i - 1].isalnum())]
+
+
+def _items(task):
+    """Yields ``(field, position, lowercased text)`` for one task's searchable strings."""
+    chapter = task.get("Chapter")
+    if chapter:
+        yield "Chapter", 0, chapter.lower()
+    for field in ("SN", "LAQ"):
+        for position, text in enumerate(task.get(field) or []):
+            if text:
+                yield field, position, text.lower()
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings = {}  # gram -> {(key, field, position)}
+        self._texts = {}     # (key, field, position) -> lowercased text
+        self._entries = {}   # key -> [(key, field, position)]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, task):
+        """Indexes a task, replacing whatever was indexed for ``key`` before."""
+        self.remove(key)
+        entries = []
+        for field, position, text in _items(task):
+            entry = (key, field, position)
+            self._texts[entry] = text
+            for gram in _all_grams(text):
+                self._postings.setdefault(gram, set()).add(entry)
+            entries.append(entry)
+        if entries:
+            self._entries[key] = entries
+
+    def remove(self, key):
+        for entry in self._entries.pop(key, ()):
+            for gram in _all_grams(self._texts.pop(entry)):
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    postings.discard(entry)
+                    if not postings:
+                        del self._postings[gram]
+
+    def _candidates(self, query):
+        if len(query) <= _GRAM:
+            return self._postings.get(query, set()), True
+        postings = sorted((self._postings.get(gram, set()) for gram in _grams(query, _GRAM)), key=len)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            if not candidates:
+                break
+            candidates &= other
+        return candidates, False
+
+    def search(self, query, prefix=False):
+        """Maps each matching task key to its matches as ``{field: [positions]}``.
+
+        Matching is case-insensitive and by substring; with ``prefix=True`` the
+        query must start a word of the text instead.
+        """
+        query = query.lower()
+        if not query:
+            return {}
+        candidates, exact = self._candidates(query)
+        matches = {}
+        for entry in candidates:
+            text = self._texts[entry]
+            if prefix:
+                if not any(text.startswith(query, i) for i in _word_starts(text)):
+                    continue
+            elif not exact and query not in text:
+                continue
+            key, field, position = entry
+            matches.setdefault(key, {}).setdefault(field, []).append(position)
+        for fields in matches.values():
+            for positions in fields.values():
+                positions.sort()
+        return matches
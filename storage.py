@@ -0,0 +1,531 @@
+"""Storage backends for the Study Tracker task tree.
+
+The app talks to a small path-based interface modelled on the Firebase
+Realtime Database: values live in a JSON tree and are addressed by
+slash-separated paths such as ``tasks/<key>``. Three backends implement it:
+
+* ``firebase`` - the production Realtime Database (default).
+* ``sqlite``   - a local file, handy for offline work and profiling.
+* ``memory``   - a process-local tree, for benchmarks and load tests.
+
+The backend is picked from the ``[storage]`` table in ``.streamlit/secrets.toml``::
+
+    [storage]
+    backend = "sqlite"              # "firebase", "sqlite" or "memory"
+    sqlite_path = "study_tracker.db"
+    seed_path = "tasks.json"        # optional JSON tree loaded into memory/sqlite
+    live = true                     # follow the change stream instead of ETag revalidation
+    lazy_subjects = true            # without live, fetch one subject at a time by query
+
+Subject queries rely on the ``.indexOn`` rule in ``database.rules.json``;
+deploy it with ``firebase deploy --only database``.
+"""
+import concurrent.futures
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+# --- PATH & TREE HELPERS ---
+def split_path(path):
+    return [part for part in str(path or "").split("/") if part]
+
+
+def join_path(*parts):
+    return "/".join(p for part in parts for p in split_path(part))
+
+
+def _to_tree(value):
+    """Normalizes a JSON value the way Firebase stores it.
+
+    Lists become dicts keyed by index, ``None`` entries and empty containers
+    are dropped. Returns ``None`` when nothing would be stored.
+    """
+    if isinstance(value, (list, tuple)):
+        value = {str(i): v for i, v in enumerate(value)}
+    if isinstance(value, dict):
+        node = {}
+        for k, v in value.items():
+            child = _to_tree(v)
+            if child is not None:
+                node[str(k)] = child
+        return node or None
+    return value
+
+
+def _from_tree(node):
+    """Turns dicts with (mostly) dense integer keys back into lists, like Firebase does."""
+    if not isinstance(node, dict):
+        return node
+    keys = list(node.keys())
+    if keys and all(k.isdigit() and (k == "0" or not k.startswith("0")) for k in keys):
+        highest = max(int(k) for k in keys)
+        if len(keys) * 2 > highest:
+            out = [None] * (highest + 1)
+            for k, v in node.items():
+                out[int(k)] = _from_tree(v)
+            return out
+    return {k: _from_tree(v) for k, v in node.items()}
+
+
+def stored_form(value):
+    """``value`` the way a read returns it after it is written (empty lists dropped, dense dicts as lists)."""
+    return _from_tree(_to_tree(value))
+
+
+def increment(delta):
+    """A server-side counter increment, usable as a top-level value in ``set``/``update``."""
+    return {".sv": {"increment": delta}}
+
+
+def is_increment(value):
+    return isinstance(value, dict) and isinstance(value.get(".sv"), dict) and "increment" in value[".sv"]
+
+
+def _child_value(node, child):
+    for part in split_path(child):
+        if not isinstance(node, dict):
+            return None
+        node = node.get(part)
+    return node
+
+
+def _like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _etag(value):
+    return hashlib.md5(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _flatten(prefix, node, out):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            _flatten(f"{prefix}/{k}" if prefix else k, v, out)
+    elif node is not None:
+        out.append((prefix, node))
+    return out
+
+
+# --- BACKEND INTERFACE ---
+class StorageBackend:
+    """Minimal path-based interface shared by all backends."""
+
+    name = "base"
+
+    def get(self, path):
+        raise NotImplementedError
+
+    def get_with_etag(self, path):
+        """Returns ``(value, etag)`` for ``path``."""
+        value = self.get(path)
+        return value, _etag(value)
+
+    def get_if_changed(self, path, etag):
+        """Returns ``(changed, value, etag)``; value and etag are ``None`` when unchanged."""
+        value, current = self.get_with_etag(path)
+        if current == etag:
+            return False, None, None
+        return True, value, current
+
+    def query_equal(self, path, child, value):
+        """Returns the children of ``path`` whose ``child`` field equals ``value``.
+
+        Firebase answers this from the ``.indexOn`` rule in ``database.rules.json``.
+        """
+        data = self.get(path) or {}
+        return {k: v for k, v in data.items() if _child_value(v, child) == value}
+
+    def distinct_child_values(self, path, child):
+        """Returns the sorted distinct string values of ``child`` across ``path``'s children."""
+        data = self.get(path) or {}
+        return sorted({v for v in (_child_value(node, child) for node in data.values()) if isinstance(v, str)})
+
+    def set(self, path, value):
+        raise NotImplementedError
+
+    def delete(self, path):
+        raise NotImplementedError
+
+    def update(self, values):
+        """Applies a multi-path update: ``{"tasks/<key>/check/SN": "b1:...", ...}``.
+
+        Paths are relative to the database root and all writes land together;
+        a ``None`` value deletes that path.
+        """
+        raise NotImplementedError
+
+    def transaction(self, path, update):
+        """Atomically replaces the value at ``path`` with ``update(current)``; returns the new value.
+
+        Firebase calls ``update`` again when another client wrote in between, so it
+        must only compute its result from the value it is given.
+        """
+        raise NotImplementedError
+
+    def submit(self, method, *args):
+        """Runs ``self.<method>(*args)`` and returns a finished Future; ``DatabaseClient`` runs it on a pool."""
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(getattr(self, method)(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _resolve_increments(self, values):
+        # Local stand-in for Firebase resolving {".sv": {"increment": n}} on the server.
+        return {
+            path: (self.get(path) or 0) + value[".sv"]["increment"] if is_increment(value) else value
+            for path, value in values.items()
+        }
+
+    def listen(self, path, callback):
+        """Streams changes under ``path`` as ``callback(event_type, rel_path, data)``.
+
+        Mirrors Firebase's SSE events: an initial ``put`` of the whole node at
+        ``/``, then ``put``/``patch`` events. Returns an object with ``close()``.
+        """
+        raise NotImplementedError
+
+
+class _LocalListener:
+    def __init__(self, owner, path, callback):
+        self._owner = owner
+        self.parts = split_path(path)
+        self.callback = callback
+
+    def close(self):
+        with self._owner._lock:
+            if self in self._owner._listeners:
+                self._owner._listeners.remove(self)
+
+
+class _LocalEventsMixin:
+    """Delivers Firebase-style change events for backends living in this process."""
+
+    def listen(self, path, callback):
+        with self._lock:
+            listener = _LocalListener(self, path, callback)
+            self._listeners.append(listener)
+            callback("put", "/", self.get(path))
+        return listener
+
+    def _notify(self, values):
+        # Called with the lock held, so listeners see writes in order.
+        for listener in list(self._listeners):
+            depth, inside, covered = len(listener.parts), {}, False
+            for path, value in values.items():
+                parts = split_path(path)
+                if parts[:depth] == listener.parts:
+                    inside["/".join(parts[depth:])] = value
+                elif listener.parts[:len(parts)] == parts:
+                    covered = True
+            if covered:
+                listener.callback("put", "/", self.get("/".join(listener.parts)))
+            elif len(inside) == 1:
+                (rel, value), = inside.items()
+                listener.callback("put", "/" + rel, value)
+            elif inside:
+                listener.callback("patch", "/", inside)
+
+
+class FirebaseBackend(StorageBackend):
+    """Thin wrapper around ``firebase_admin.db``; the app must be initialized first."""
+
+    name = "firebase"
+
+    def __init__(self):
+        from firebase_admin import db
+        self._db = db
+
+    def _ref(self, path):
+        return self._db.reference("/" + join_path(path))
+
+    def get(self, path):
+        return self._ref(path).get()
+
+    def get_with_etag(self, path):
+        return self._ref(path).get(etag=True)
+
+    def get_if_changed(self, path, etag):
+        # Answered with a bodiless 304 when the node is unchanged.
+        return self._ref(path).get_if_changed(etag)
+
+    def query_equal(self, path, child, value):
+        return dict(self._ref(path).order_by_child(child).equal_to(value).get() or {})
+
+    def distinct_child_values(self, path, child):
+        # Walks the child index one value at a time, so the cost is one tiny query per distinct value.
+        values, start = [], ""
+        while True:
+            page = self._ref(path).order_by_child(child).start_at(start).limit_to_first(1).get()
+            value = _child_value(next(iter(page.values())), child) if page else None
+            if not isinstance(value, str):
+                return values
+            values.append(value)
+            start = value + "\u0000"
+
+    def set(self, path, value):
+        self._ref(path).set(value)
+
+    def delete(self, path):
+        self._ref(path).delete()
+
+    def update(self, values):
+        if values:
+            self._ref("").update({join_path(path): value for path, value in values.items()})
+
+    def transaction(self, path, update):
+        return self._ref(path).transaction(update)
+
+    def listen(self, path, callback):
+        return self._ref(path).listen(lambda event: callback(event.event_type, event.path, event.data))
+
+
+class MemoryBackend(_LocalEventsMixin, StorageBackend):
+    """Keeps the whole tree in a nested dict guarded by a lock."""
+
+    name = "memory"
+
+    def __init__(self, data=None):
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._root = _to_tree(data) or {}
+
+    def get(self, path):
+        with self._lock:
+            node = self._root
+            for part in split_path(path):
+                if not isinstance(node, dict) or part not in node:
+                    return None
+                node = node[part]
+            return _from_tree(json.loads(json.dumps(node))) if node != {} else None
+
+    def _children(self, path):
+        node = self._root
+        for part in split_path(path):
+            node = node.get(part) if isinstance(node, dict) else None
+        return node if isinstance(node, dict) else {}
+
+    def query_equal(self, path, child, value):
+        with self._lock:
+            return {
+                key: _from_tree(json.loads(json.dumps(node)))
+                for key, node in self._children(path).items()
+                if _child_value(node, child) == value
+            }
+
+    def distinct_child_values(self, path, child):
+        with self._lock:
+            values = {_child_value(node, child) for node in self._children(path).values()}
+        return sorted(v for v in values if isinstance(v, str))
+
+    def set(self, path, value):
+        with self._lock:
+            value = self._resolve_increments({path: value})[path]
+            self._write(split_path(path), _to_tree(value))
+            self._notify({path: value})
+
+    def delete(self, path):
+        with self._lock:
+            self._write(split_path(path), None)
+            self._notify({path: None})
+
+    def update(self, values):
+        with self._lock:
+            values = self._resolve_increments(values)
+            for path, value in values.items():
+                self._write(split_path(path), _to_tree(value))
+            self._notify(values)
+
+    def transaction(self, path, update):
+        with self._lock:
+            value = update(self.get(path))
+            self.set(path, value)
+            return value
+
+    def _write(self, parts, node):
+        if not parts:
+            self._root = node if isinstance(node, dict) else {}
+            return
+        parent, trail = self._root, []
+        for part in parts[:-1]:
+            child = parent.get(part)
+            if not isinstance(child, dict):
+                if node is None:
+                    return
+                child = parent[part] = {}
+            trail.append((parent, part))
+            parent = child
+        if node is None:
+            parent.pop(parts[-1], None)
+            # Firebase never keeps empty parents around.
+            for ancestor, part in reversed(trail):
+                if ancestor[part]:
+                    break
+                del ancestor[part]
+        else:
+            parent[parts[-1]] = node
+
+
+class SQLiteBackend(_LocalEventsMixin, StorageBackend):
+    """Stores every leaf of the tree as a row keyed by its full path.
+
+    Subtree reads and deletes are range scans on the primary key, so reading or
+    rewriting one task never touches the rest of the table.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path="study_tracker.db"):
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA case_sensitive_like = ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes (path TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID"
+        )
+        # Plays the role of Firebase's .indexOn for equality queries on a child value.
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nodes_value ON nodes (value)")
+        self._conn.commit()
+
+    @staticmethod
+    def _subtree_clause(path):
+        if not path:
+            return "1", ()
+        return "(path = ? OR (path >= ? AND path < ?))", (path, path + "/", path + "0")
+
+    def get(self, path):
+        path = join_path(path)
+        clause, params = self._subtree_clause(path)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT path, value FROM nodes WHERE {clause}", params).fetchall()
+        if not rows:
+            return None
+        root = {}
+        offset = len(path) + 1 if path else 0
+        for row_path, raw in rows:
+            if row_path == path:
+                return json.loads(raw)
+            parts = row_path[offset:].split("/")
+            node = root
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+            node[parts[-1]] = json.loads(raw)
+        return _from_tree(root)
+
+    @staticmethod
+    def _child_pattern(path, child):
+        prefix = _like_escape(path) + "/" if path else ""
+        return f"{prefix}%/{_like_escape(join_path(child))}"
+
+    def query_equal(self, path, child, value):
+        path = join_path(path)
+        depth = len(split_path(path))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM nodes WHERE value = ? AND path LIKE ? ESCAPE '\\'",
+                (json.dumps(value), self._child_pattern(path, child)),
+            ).fetchall()
+        keys = {split_path(row_path)[depth] for row_path, in rows}
+        matches = {key: self.get(join_path(path, key)) for key in keys}
+        # LIKE's % can span several levels, so confirm the match sits exactly at ``child``.
+        return {k: v for k, v in matches.items() if _child_value(v, child) == value}
+
+    def distinct_child_values(self, path, child):
+        path = join_path(path)
+        depth = len(split_path(path)) + 1 + len(split_path(child))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, value FROM nodes WHERE path LIKE ? ESCAPE '\\'", (self._child_pattern(path, child),)
+            ).fetchall()
+        values = {json.loads(raw) for row_path, raw in rows if len(split_path(row_path)) == depth}
+        return sorted(v for v in values if isinstance(v, str))
+
+    def set(self, path, value):
+        with self._lock:
+            value = self._resolve_increments({path: value})[path]
+            with self._conn:
+                self._write(join_path(path), _to_tree(value))
+            self._notify({path: value})
+
+    def delete(self, path):
+        with self._lock:
+            with self._conn:
+                self._write(join_path(path), None)
+            self._notify({path: None})
+
+    def update(self, values):
+        with self._lock:
+            values = self._resolve_increments(values)
+            with self._conn:
+                for path, value in values.items():
+                    self._write(join_path(path), _to_tree(value))
+            self._notify(values)
+
+    def transaction(self, path, update):
+        with self._lock:
+            value = update(self.get(path))
+            self.set(path, value)
+            return value
+
+    def _write(self, path, node):
+        clause, params = self._subtree_clause(path)
+        self._conn.execute(f"DELETE FROM nodes WHERE {clause}", params)
+        parts = split_path(path)
+        ancestors = ["/".join(parts[:i]) for i in range(1, len(parts))]
+        if ancestors:
+            self._conn.execute(
+                f"DELETE FROM nodes WHERE path IN ({','.join('?' * len(ancestors))})", ancestors
+            )
+        if node is not None:
+            self._conn.executemany(
+                "INSERT INTO nodes (path, value) VALUES (?, ?)",
+                [(p, json.dumps(v)) for p, v in _flatten(path, node, [])],
+            )
+
+
+_FIREBASE_CREDENTIAL_FIELDS = (
+    "type", "project_id", "private_key_id", "private_key", "client_email", "client_id", "auth_uri",
+    "token_uri", "auth_provider_x509_cert_url", "client_x509_cert_url", "universe_domain",
+)
+
+
+def initialize_firebase_app(secrets, http_timeout=None):
+    """Initializes the default ``firebase_admin`` app from a ``[firebase]`` secrets mapping.
+
+    ``http_timeout`` (seconds) bounds each HTTP request to the Realtime Database.
+    """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    if firebase_admin._apps:
+        return
+    firebase_creds = {field: secrets[field] for field in _FIREBASE_CREDENTIAL_FIELDS}
+    # The private key is usually stored with escaped newlines.
+    firebase_creds["private_key"] = firebase_creds["private_key"].replace("\\n", "\n")
+    options = {"databaseURL": secrets["database_url"]}
+    if http_timeout:
+        options["httpTimeout"] = http_timeout
+    firebase_admin.initialize_app(credentials.Certificate(firebase_creds), options)
+
+
+def create_backend(config=None):
+    """Builds the backend described by a ``[storage]`` config mapping."""
+    config = dict(config or {})
+    kind = config.get("backend", "firebase")
+    if kind == "firebase":
+        return FirebaseBackend()
+    if kind == "memory":
+        backend = MemoryBackend()
+    elif kind == "sqlite":
+        backend = SQLiteBackend(config.get("sqlite_path", "study_tracker.db"))
+    else:
+        raise ValueError(f"Unknown storage backend '{kind}'. Use 'firebase', 'sqlite' or 'memory'.")
+    seed_path = config.get("seed_path")
+    if seed_path and backend.get("") is None:
+        with open(seed_path, encoding="utf-8") as fh:
+            backend.set("", json.load(fh))
+    return backend
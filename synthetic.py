@@ -0,0 +1,106 @@
+"""Synthetic task trees for benchmarks, load tests and demos.
+
+Builds a database tree shaped like the real one (``tasks`` plus the
+``subjects`` catalog) with a configurable number of subjects, chapters per
+subject and SN/LAQ items per chapter. Output is deterministic for a seed::
+
+    python synthetic.py --items 10000 > tasks.json
+
+and loads into a local backend with ``seed_path = "tasks.json"`` under
+``[storage]``. The app reads ``users/<uid>/``, so pass ``--user default`` for
+a seed it opens directly; without it the tree has the flat pre-partition
+layout that ``manage.py partition-users`` migrates.
+"""
+import argparse
+import json
+import random
+import sys
+import uuid
+from datetime import date, timedelta
+
+import bitset
+import catalog
+import partitions
+
+_TOPICS = [
+    "Anatomy", "Physiology", "Biochemistry", "Pathology", "Pharmacology", "Microbiology", "Forensic Medicine",
+    "Community Medicine", "Ophthalmology", "Otorhinolaryngology", "Medicine", "Surgery", "Paediatrics", "Obstetrics",
+]
+_WORDS = [
+    "mechanism", "regulation", "clinical", "features", "classification", "management", "complications", "pathway",
+    "receptor", "synthesis", "transport", "deficiency", "diagnosis", "investigations", "structure", "blood", "supply",
+    "nerve", "hormone", "enzyme", "acute", "chronic", "renal", "cardiac", "hepatic", "pulmonary", "immune", "factors",
+]
+
+
+def _phrase(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize()
+
+
+def subject_names(count):
+    return [_TOPICS[i % len(_TOPICS)] + (f" {i // len(_TOPICS) + 1}" if i >= len(_TOPICS) else "") for i in range(count)]
+
+
+def generate_tasks(subjects=3, chapters=10, sn=6, laq=3, done_ratio=0.3, seed=0, start=None, legacy_checks=False):
+    """Returns ``{key: {"task": ..., "check": ...}}``.
+
+    Item counts per chapter vary around ``sn``/``laq`` (±50%), so totals are
+    approximately ``subjects * chapters * (sn + laq)``. Checks are ``bitset``
+    strings, or boolean lists as stored before that encoding with ``legacy_checks``.
+    """
+    rng = random.Random(seed)
+    start = start or date(2026, 1, 1)
+    tasks = {}
+    for subject in subject_names(subjects):
+        for number in range(1, chapters + 1):
+            items = {
+                kind: [f"{_phrase(rng, rng.randint(2, 6))} ({kind} {number}.{i + 1})" for i in range(rng.randint(mean - mean // 2, mean + mean // 2))]
+                for kind, mean in (("SN", sn), ("LAQ", laq))
+            }
+            task = {
+                "Subject": subject,
+                "Chapter": f"Chapter {number}: {_phrase(rng, 3)}",
+                "SN": items["SN"],
+                "LAQ": items["LAQ"],
+                "Priority": rng.choice(["High", "Medium", "Low"]),
+                "Deadline": str(start + timedelta(days=rng.randint(0, 365))),
+            }
+            check = {kind: [rng.random() < done_ratio for _ in texts] for kind, texts in items.items()}
+            if not legacy_checks:
+                check = bitset.encode_check(check)
+            tasks[str(uuid.UUID(int=rng.getrandbits(128)))] = {"task": task, "check": check}
+    return tasks
+
+
+def generate_tree(items=1000, subjects=None, sn=6, laq=3, done_ratio=0.3, seed=0, legacy_checks=False, user=None):
+    """A full database tree with about ``items`` SN/LAQ items, sized by chapter count; nested under ``user`` if given."""
+    subjects = subjects or max(1, min(20, items // 500 or 1))
+    chapters = max(1, round(items / (subjects * (sn + laq))))
+    tasks = generate_tasks(subjects, chapters, sn, laq, done_ratio, seed, legacy_checks=legacy_checks)
+    tree = {partitions.FLAT_TASKS_PATH: tasks, partitions.FLAT_CATALOG_PATH: catalog.build_catalog(tasks)}
+    return {partitions.USERS_PATH: {user: tree}} if user else tree
+
+
+def count_items(tasks):
+    return sum(len(value["task"].get("SN") or []) + len(value["task"].get("LAQ") or []) for value in tasks.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000, help="approximate number of SN/LAQ items")
+    parser.add_argument("--subjects", type=int, help="number of subjects (default: scales with --items)")
+    parser.add_argument("--sn", type=int, default=6, help="mean SN items per chapter")
+    parser.add_argument("--laq", type=int, default=3, help="mean LAQ items per chapter")
+    parser.add_argument("--done", type=float, default=0.3, help="fraction of items ticked")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy-checks", action="store_true", help="store ticks as boolean lists (pre-bitset format)")
+    parser.add_argument("--user", type=partitions.normalize_user, help="nest the tree under users/<user> (default: flat layout)")
+    args = parser.parse_args(argv)
+    tree = generate_tree(args.items, args.subjects, args.sn, args.laq, args.done, args.seed, args.legacy_checks, args.user)
+    json.dump(tree, sys.stdout)
+    tasks = tree[partitions.USERS_PATH][args.user]["tasks"] if args.user else tree["tasks"]
+    print(f"{len(tasks)} chapters, {count_items(tasks)} items", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
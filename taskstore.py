@@ -0,0 +1,334 @@
+"""Column-wise, indexed store for the tasks a session has loaded.
+
+The task dicts are kept as they come from the database and the check dicts
+in the compact ``bitset`` encoding (legacy boolean lists are encoded on the
+way in), next to NumPy columns for the fields the app filters and sorts on (subject,
+priority, parsed deadline, done/total counts). Secondary indexes by subject
+and priority narrow a filter to candidate rows, and the remaining
+conditions are vectorized masks rather than a Python loop over every task.
+Chapter and SN/LAQ text is kept in a ``SearchIndex`` for the search box.
+Filtered-and-sorted results are memoized per filter signature until a task
+is added, edited or removed.
+"""
+import collections
+import uuid
+from datetime import date
+
+import numpy as np
+
+import bitset
+from catalog import task_counts
+from searchindex import SearchIndex
+
+PRIORITIES = ["High", "Medium", "Low"]
+_OTHER_PRIORITY = len(PRIORITIES)
+
+# Deadline column values that are not day ordinals.
+NO_DEADLINE = -1       # the task has no Deadline; excluded whenever a date filter is set
+INVALID_DEADLINE = -2  # the Deadline does not parse; date filters let it through
+_LAST_DAY = date.max.toordinal()
+
+_MAX_VIEWS = 8  # filtered-and-sorted results remembered per store
+ITEM_IDS_FIELD = "ItemIds"  # task field: {"SN": [item id, ...], "LAQ": [...]}, parallel to the item texts
+
+
+def parse_deadline(value):
+    if not value:
+        return NO_DEADLINE
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return INVALID_DEADLINE
+
+
+def item_ids(task, kind):
+    """Stable IDs of a task's SN or LAQ items, by position.
+
+    Tasks saved before items had IDs get positional ones (``p0``, ``p1``, ...);
+    they are stored with the task on its first edit and then follow the items.
+    """
+    items = task.get(kind) or []
+    ids = (task.get(ITEM_IDS_FIELD) or {}).get(kind) or []
+    if len(ids) == len(items):
+        return list(ids)
+    return [f"p{i}" for i in range(len(items))]
+
+
+def diff_items(old_items, old_ids, new_items):
+    """Matches an edited item list against the old one in linear time.
+
+    Unchanged texts keep their item (duplicates pair up in order). A new text
+    sitting right after the previous kept item, where that old slot's text
+    vanished, is treated as that item renamed. Everything else is added or
+    removed. Returns ``(new_ids, sources, summary)``: ``sources[i]`` is the old
+    position of new item ``i`` or None if it is new, and ``summary`` counts
+    ``added``, ``removed``, ``renamed`` and ``moved`` items.
+    """
+    by_text = {}
+    for position, text in enumerate(old_items):
+        by_text.setdefault(text, collections.deque()).append(position)
+    sources = []
+    for text in new_items:
+        positions = by_text.get(text)
+        sources.append(positions.popleft() if positions else None)
+    claimed = [False] * len(old_items)
+    for source in sources:
+        if source is not None:
+            claimed[source] = True
+    renamed = 0
+    previous = -1
+    for i, source in enumerate(sources):
+        if source is None and previous + 1 < len(old_items) and not claimed[previous + 1]:
+            source = sources[i] = previous + 1
+            claimed[source] = True
+            renamed += 1
+        if source is not None:
+            previous = source
+    new_ids, taken = [], set(old_ids)
+    for source in sources:
+        if source is None:
+            item_id = uuid.uuid4().hex[:8]
+            while item_id in taken:
+                item_id = uuid.uuid4().hex[:8]
+            taken.add(item_id)
+            new_ids.append(item_id)
+        else:
+            new_ids.append(old_ids[source])
+    kept = [source for source in sources if source is not None]
+    # Items out of order relative to the previous kept one count as moved.
+    moved = sum(1 for before, after in zip(kept, kept[1:]) if after < before)
+    summary = {"added": len(new_items) - len(kept), "removed": len(old_items) - len(kept), "renamed": renamed, "moved": moved}
+    return new_ids, sources, summary
+
+
+def edit_task(old_task, old_checks, new_task):
+    """Applies an edit's new SN/LAQ lists to a task.
+
+    Returns ``(task, checks, summary)``: ``new_task`` with its ``ItemIds``, the
+    encoded checks with each kept or renamed item's tick carried over, and the
+    per-kind ``diff_items`` summaries.
+    """
+    task, checks, summary = dict(new_task), {}, {}
+    ids = {}
+    for kind in bitset.KINDS:
+        old_items = old_task.get(kind) or []
+        old_states = bitset.decode(old_checks.get(kind), len(old_items))
+        ids[kind], sources, summary[kind] = diff_items(old_items, item_ids(old_task, kind), new_task.get(kind) or [])
+        checks[kind] = bitset.encode([source is not None and old_states[source] for source in sources])
+    task[ITEM_IDS_FIELD] = ids
+    return task, checks, summary
+
+
+def _diff_paths(path, old, new, out):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() | new.keys():
+            _diff_paths(f"{path}/{key}", old.get(key), new.get(key), out)
+    elif isinstance(old, list) and isinstance(new, list):
+        for i in range(max(len(old), len(new))):
+            _diff_paths(f"{path}/{i}", old[i] if i < len(old) else None, new[i] if i < len(new) else None, out)
+    elif old != new:
+        out[path] = new
+    return out
+
+
+def edit_changes(old_task, old_checks, task, checks):
+    """Paths under a task's node that differ after an edit, e.g. ``{"task/SN/3": "...", "task/SN/7": None}``.
+
+    Lists are compared index by index, so renaming one item writes one path.
+    """
+    changes = _diff_paths("task", old_task, task, {})
+    changes.update({f"check/{kind}": value for kind, value in checks.items() if old_checks.get(kind) != value})
+    return changes
+
+
+class TaskStore:
+    def __init__(self, records=None):
+        self.keys, self.tasks, self.checks = [], [], []
+        self._rows = {}
+        self._subject_codes, self._subject_names = {}, []
+        self._by_subject, self._by_priority = {}, {}
+        self.search_index = SearchIndex()
+        self._subject = np.empty(0, dtype=np.int32)
+        self._priority = np.empty(0, dtype=np.int8)
+        self._deadline = np.empty(0, dtype=np.int32)
+        self._done = np.empty(0, dtype=np.int32)
+        self._total = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._views = {}
+        self.version = 0       # bumped by every change, checkbox toggles included
+        self.rows_version = 0  # bumped only when tasks are added, edited or removed
+        for key, value in (records or {}).items():
+            self.upsert(key, value.get("task", {}), value.get("check", {}))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    # --- Row bookkeeping ---
+    def _grow(self):
+        capacity = max(16, 2 * len(self._alive))
+        for name in ("_subject", "_priority", "_deadline", "_done", "_total", "_alive"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _subject_code(self, subject):
+        if subject not in self._subject_codes:
+            self._subject_codes[subject] = len(self._subject_names)
+            self._subject_names.append(subject)
+        return self._subject_codes[subject]
+
+    def _index(self, row, add):
+        for index, value in ((self._by_subject, int(self._subject[row])), (self._by_priority, int(self._priority[row]))):
+            rows = index.setdefault(value, set())
+            if add:
+                rows.add(row)
+            else:
+                rows.discard(row)
+
+    def _fill(self, row, task, check):
+        self._subject[row] = self._subject_code(task.get("Subject"))
+        priority = task.get("Priority")
+        self._priority[row] = PRIORITIES.index(priority) if priority in PRIORITIES else _OTHER_PRIORITY
+        self._deadline[row] = parse_deadline(task.get("Deadline"))
+        self._done[row], self._total[row] = task_counts(task, check)
+        self._alive[row] = True
+
+    def _compact(self):
+        records = {key: {"task": self.tasks[row], "check": self.checks[row]} for key, row in self._rows.items()}
+        version, rows_version = self.version, self.rows_version
+        self.__init__(records)
+        self.version, self.rows_version = version, rows_version
+
+    # --- Mutations ---
+    def upsert(self, key, task, check):
+        check = bitset.encode_check(check, task)
+        row = self._rows.get(key)
+        if row is None:
+            if self._size == len(self._alive):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[key] = row
+            self.keys.append(key)
+            self.tasks.append(task)
+            self.checks.append(check)
+        else:
+            self._index(row, add=False)
+            self.tasks[row], self.checks[row] = task, check
+        self._fill(row, task, check)
+        self._index(row, add=True)
+        self.search_index.add(key, task)
+        self._rows_changed()
+        return row
+
+    def remove(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._index(row, add=False)
+        self.search_index.remove(key)
+        self._alive[row] = False
+        self.keys[row] = self.tasks[row] = self.checks[row] = None
+        self._rows_changed()
+        # Deleted rows are tombstones; rebuild once they dominate so filters stay tight.
+        if self._size > 64 and len(self._rows) * 2 < self._size:
+            self._compact()
+
+    def _rows_changed(self):
+        self.version += 1
+        self.rows_version += 1
+        self._views.clear()
+
+    def set_check(self, key, kind, index, value):
+        """Sets one item's tick; returns ``(old, new)`` encoded values of that kind's list."""
+        row = self._rows[key]
+        check = self.checks[row]
+        old = check[kind]
+        check[kind] = bitset.with_state(old, index, value, len(self.tasks[row].get(kind) or []))
+        self._done[row] += bitset.count(check[kind]) - bitset.count(old)
+        self.version += 1
+        return old, check[kind]
+
+    # --- Reads ---
+    def row_of(self, key):
+        return self._rows.get(key)
+
+    def get(self, key):
+        row = self._rows[key]
+        return self.tasks[row], self.checks[row]
+
+    def subjects(self):
+        return {self._subject_names[code] for code, rows in self._by_subject.items() if rows and self._subject_names[code] is not None}
+
+    def counts(self, row):
+        return int(self._done[row]), int(self._total[row])
+
+    def states(self, row, kind):
+        """One kind's ticks for a row as a list of booleans, one per item."""
+        return bitset.decode(self.checks[row][kind], len(self.tasks[row].get(kind) or []))
+
+    def search(self, query, prefix=False):
+        """``{key: {field: [item positions]}}`` for tasks whose text matches ``query``."""
+        return self.search_index.search(query, prefix=prefix)
+
+    def filter(self, subject=None, priorities=None, start_date=None, end_date=None, query=None):
+        """Rows matching the filters, in insertion order.
+
+        ``priorities`` and the date bounds follow the app's filter semantics:
+        an empty selection means "any", tasks without a deadline drop out once
+        a date bound is set, and unparseable deadlines pass date bounds.
+        ``query`` keeps tasks whose chapter or SN/LAQ text contains it.
+        """
+        if subject is not None:
+            code = self._subject_codes.get(subject)
+            rows = self._by_subject.get(code, set()) if code is not None else set()
+        else:
+            rows = set(self._rows.values())
+        if priorities:
+            allowed = set()
+            for priority in priorities:
+                if priority in PRIORITIES:
+                    allowed |= self._by_priority.get(PRIORITIES.index(priority), set())
+            rows = rows & allowed
+        if query:
+            rows = rows & {self._rows[key] for key in self.search(query)}
+        rows = np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+        if (start_date or end_date) and len(rows):
+            deadlines = self._deadline[rows]
+            mask = deadlines != NO_DEADLINE
+            if start_date:
+                mask &= (deadlines >= start_date.toordinal()) | (deadlines == INVALID_DEADLINE)
+            if end_date:
+                mask &= (deadlines <= end_date.toordinal()) | (deadlines == INVALID_DEADLINE)
+            rows = rows[mask]
+        return rows
+
+    def sort_rows(self, rows):
+        """Orders rows by deadline, then priority (High first); ties keep insertion order."""
+        if not len(rows):
+            return rows
+        deadlines = self._deadline[rows]
+        deadlines = np.where(deadlines < 0, _LAST_DAY, deadlines)
+        priorities = self._priority[rows]
+        priorities = np.where(priorities == _OTHER_PRIORITY, PRIORITIES.index("Medium"), priorities)
+        return rows[np.lexsort((priorities, deadlines))]
+
+    def view(self, subject=None, priorities=None, start_date=None, end_date=None, query=None):
+        """``sort_rows(filter(...))``, memoized on the filters and ``rows_version``.
+
+        Checkbox toggles change neither membership nor order, so they keep the
+        cached views; reruns from unrelated widgets reuse them as well.
+        """
+        signature = (subject, tuple(priorities or ()), start_date, end_date, (query or "").lower(), self.rows_version)
+        rows = self._views.get(signature)
+        if rows is None:
+            rows = self.sort_rows(self.filter(subject, priorities, start_date, end_date, query))
+            if len(self._views) >= _MAX_VIEWS:
+                self._views.pop(next(iter(self._views)))
+            self._views[signature] = rows
+        return rows
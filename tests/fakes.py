@@ -0,0 +1,50 @@
+"""Test doubles: an in-memory database whose writes can be slowed down or made to fail."""
+import threading
+import time
+
+from storage import MemoryBackend
+
+
+class FlakyBackend(MemoryBackend):
+    """A ``MemoryBackend`` whose ``update``/``transaction`` calls can be delayed or fail.
+
+    ``delay`` seconds pass before each write is applied, so a caller with a shorter
+    timeout gives up on a write that still lands. The next ``failures`` writes raise
+    ``ConnectionError`` without touching the data. ``writes`` counts applied writes.
+    """
+
+    def __init__(self, data=None, delay=0.0, failures=0):
+        super().__init__(data)
+        self.delay = delay
+        self.failures = failures
+        self.writes = 0
+        self.attempts = []  # time.monotonic() of every write attempt
+        self._fail_lock = threading.Lock()
+
+    def _attempt(self):
+        self.attempts.append(time.monotonic())
+        if self.delay:
+            time.sleep(self.delay)
+        with self._fail_lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("database unreachable")
+
+    def update(self, values):
+        self._attempt()
+        super().update(values)
+        self.writes += 1
+
+    def transaction(self, path, update):
+        self._attempt()
+        value = super().transaction(path, update)
+        self.writes += 1
+        return value
+
+
+def wait_for(condition, timeout=5.0):
+    """Polls ``condition`` until it is true; returns its last value."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
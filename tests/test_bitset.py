@@ -0,0 +1,68 @@
+import pytest
+
+import bitset
+
+
+@pytest.mark.parametrize("states", [
+    [],
+    [True],
+    [False],
+    [True, False, True],
+    [False] * 7 + [True],
+    [True] * 8,
+    [i % 3 == 0 for i in range(41)],
+])
+def test_encode_decode_round_trip(states):
+    encoded = bitset.encode(states)
+    assert bitset.is_encoded(encoded)
+    assert bitset.decode(encoded) == states
+    assert bitset.count(encoded) == sum(states)
+    assert bitset.encode(encoded) == encoded
+
+
+def test_decode_pads_or_cuts_to_length():
+    encoded = bitset.encode([True, True])
+    assert bitset.decode(encoded, 4) == [True, True, False, False]
+    assert bitset.decode(encoded, 1) == [True]
+
+
+def test_legacy_list_decodes():
+    assert bitset.decode([False, True]) == [False, True]
+    assert bitset.count([True, False, True]) == 2
+
+
+def test_legacy_sparse_dict_decodes():
+    # Firebase returns a list with missing indexes as a dict keyed by index.
+    assert bitset.decode({"0": True, "2": True}) == [True, False, True]
+    assert bitset.decode({"1": False, "3": True}, 5) == [False, False, False, True, False]
+    assert bitset.count({"0": True, "4": False, "5": True}) == 2
+
+
+def test_none_is_empty():
+    assert bitset.decode(None) == []
+    assert bitset.decode(None, 2) == [False, False]
+    assert bitset.count(None) == 0
+
+
+@pytest.mark.parametrize("value", [None, [], [True, False, True], {"1": True}, bitset.encode([False, True, True])])
+def test_with_state_sets_one_item(value):
+    before = bitset.decode(value, 3)
+    for index in range(3):
+        for state in (True, False):
+            after = bitset.decode(bitset.with_state(value, index, state, 3))
+            assert after == [state if i == index else before[i] for i in range(3)]
+
+
+def test_with_state_grows_past_the_stored_length():
+    value = bitset.with_state(bitset.encode([]), 9, True)
+    assert bitset.decode(value) == [False] * 9 + [True]
+    assert bitset.decode(bitset.with_state(value, 2, True, 12)) == [False, False, True] + [False] * 6 + [True, False, False]
+
+
+def test_encode_check_sizes_lists_to_the_task():
+    task = {"SN": ["a", "b", "c"], "LAQ": ["x"]}
+    check = bitset.encode_check({"SN": [True], "LAQ": {"0": True}}, task)
+    assert bitset.decode(check["SN"]) == [True, False, False]
+    assert bitset.decode(check["LAQ"]) == [True]
+    assert not bitset.needs_encoding(check)
+    assert bitset.needs_encoding({"SN": [True]})
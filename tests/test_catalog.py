@@ -0,0 +1,43 @@
+import catalog
+from storage import increment
+
+
+def test_counter_changes_bumps_rev_and_keeps_the_name():
+    key = catalog.subject_key("Maths")
+    assert catalog.counter_changes("Maths", tasks=1, total=3) == {
+        f"subjects/{key}/tasks": increment(1),
+        f"subjects/{key}/total": increment(3),
+        f"subjects/{key}/rev": increment(1),
+        f"subjects/{key}/name": "Maths",
+    }
+
+
+def test_counter_changes_is_empty_without_a_delta_or_a_subject():
+    assert catalog.counter_changes("Maths") == {}
+    assert catalog.counter_changes("", tasks=1) == {}
+    assert catalog.counter_changes(None, done=1) == {}
+
+
+def test_merge_changes_adds_up_increments_and_drops_the_ones_that_cancel():
+    task = {"Subject": "Maths", "SN": ["a", "b"]}
+    removed = catalog.task_changes(task, {"SN": [True, False]}, -1)
+    added = catalog.task_changes(task, {"SN": [True, True]}, 1)
+    key = catalog.subject_key("Maths")
+    assert catalog.merge_changes(removed, added) == {
+        f"subjects/{key}/done": increment(1),
+        f"subjects/{key}/rev": increment(2),
+        f"subjects/{key}/name": "Maths",
+    }
+
+
+def test_build_catalog_reads_list_shaped_trees():
+    tasks = [
+        None,
+        {"task": {"Subject": "Maths", "SN": ["a", "b"]}, "check": {"SN": [True, False]}},
+        {"task": {"Subject": "Maths", "LAQ": ["c"]}, "check": {"LAQ": [True]}},
+        {"task": {"Subject": ""}},
+    ]
+    built = catalog.build_catalog(tasks)
+    assert built == {catalog.subject_key("Maths"): {"name": "Maths", "tasks": 2, "done": 2, "total": 3}}
+    stored = [built[catalog.subject_key("Maths")], {"name": "Empty", "tasks": 0}, "junk"]
+    assert list(catalog.subjects_in(stored)) == ["Maths"]
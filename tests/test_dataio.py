@@ -0,0 +1,77 @@
+import bitset
+import catalog
+import dataio
+from storage import increment
+
+CSV = b"""Subject,Chapter,Type,Task,Priority,Deadline,Status
+Maths,Algebra,SN,Groups,High,2026-11-02,done
+Maths,Algebra,laq,Rings,,,
+Maths,Calculus,SN,Limits,Low,next week,
+Physics,Optics,SN,Lenses,,2026-11-30,
+,Orphan,SN,No subject,,,
+"""
+
+
+def imported():
+    return dataio.group_tasks(dataio.read_import(CSV, "tasks.csv"))
+
+
+def test_group_tasks_skips_rows_with_an_invalid_deadline():
+    pairs, skipped = imported()
+    assert skipped == 2
+    assert [(task["Subject"], task["Chapter"]) for task, _ in pairs] == [("Maths", "Algebra"), ("Physics", "Optics")]
+    task, check = pairs[0]
+    assert task == {"Subject": "Maths", "Chapter": "Algebra", "SN": ["Groups"], "LAQ": ["Rings"], "Priority": "High", "Deadline": "2026-11-02"}
+    assert check == {"SN": [True], "LAQ": [False]}
+
+
+def existing_algebra(check_sn=(False,)):
+    task = {"Subject": "Maths", "Chapter": "Algebra", "SN": ["Groups"], "LAQ": ["Rings"], "Priority": "Low", "Deadline": ""}
+    return {"k1": {"task": task, "check": bitset.encode_check({"SN": list(check_sn), "LAQ": [False]}, task)}}
+
+
+def test_reimporting_the_same_chapter_changes_nothing():
+    pairs, _ = imported()
+    entries, unchanged = dataio.match_existing(pairs[:1], existing_algebra(check_sn=(True,)))
+    assert entries == []
+    assert unchanged == 1
+
+
+def test_match_existing_appends_missing_items_and_ors_the_ticks():
+    pairs, _ = imported()
+    pairs[0][0]["SN"].append("Fields")
+    pairs[0][1]["SN"].append(True)
+    existing = existing_algebra()
+    entries, unchanged = dataio.match_existing(pairs, existing)
+    assert unchanged == 0
+    (key, old, task, check), new = entries
+    assert (key, old) == ("k1", existing["k1"])
+    assert task["SN"] == ["Groups", "Fields"]
+    assert (task["Priority"], task["Deadline"]) == ("Low", "")  # the existing chapter keeps its own
+    assert bitset.decode(check["SN"], 2) == [True, True]
+    assert bitset.decode(check["LAQ"], 1) == [False]
+    assert new[:2] == (None, None)
+    assert new[2]["Subject"] == "Physics"
+
+
+def test_import_updates_adds_new_chapters_and_moves_counters_by_the_difference():
+    pairs, _ = imported()
+    existing = existing_algebra()
+    entries, _ = dataio.match_existing(pairs, existing)
+    (records, values), = dataio.import_updates(entries, "tasks")
+    new_key = next(key for key in records if key != "k1")
+    assert values[f"tasks/{new_key}"] == records[new_key]
+    assert "tasks/k1" not in values
+    assert all(path.startswith(("tasks/k1/", f"tasks/{new_key}", "subjects/")) for path in values)
+    maths, physics = catalog.subject_key("Maths"), catalog.subject_key("Physics")
+    assert f"subjects/{maths}/tasks" not in values  # the merged chapter is still one task
+    assert values[f"subjects/{maths}/done"] == increment(1)
+    assert values[f"subjects/{physics}/tasks"] == increment(1)
+    assert values[f"subjects/{physics}/total"] == increment(1)
+
+
+def test_import_updates_yields_one_update_per_chunk():
+    pairs, _ = imported()
+    entries, _ = dataio.match_existing(pairs, {})
+    chunks = list(dataio.import_updates(entries, "tasks", chunk_tasks=1))
+    assert [len(records) for records, _ in chunks] == [1, 1]
@@ -0,0 +1,46 @@
+from dbclient import DatabaseClient
+from fakes import FlakyBackend, wait_for
+from offline import OfflineBackend
+from storage import increment
+
+
+def offline_backend(tmp_path, remote, timeout=5):
+    return OfflineBackend(DatabaseClient(remote, timeout=timeout, retries=0), str(tmp_path / "cache.db"), ["users/u"], sync_interval=0.05)
+
+
+def test_local_writes_are_replayed_to_the_remote(tmp_path):
+    remote = FlakyBackend({"users": {"u": {"name": "old"}}})
+    backend = offline_backend(tmp_path, remote)
+    assert wait_for(lambda: backend.has_snapshot)
+    assert backend.get("users/u/name") == "old"
+    backend.update({"users/u/name": "new", "users/u/done": increment(2)})
+    assert backend.get("users/u/name") == "new"
+    assert wait_for(lambda: backend.pending_count == 0)
+    assert remote.get("users/u") == {"name": "new", "done": 2}
+
+
+def test_failed_replay_keeps_the_outbox_until_the_remote_is_back(tmp_path):
+    remote = FlakyBackend()
+    backend = offline_backend(tmp_path, remote)
+    assert wait_for(lambda: backend.online)
+    remote.failures = 1
+    backend.update({"users/u/done": increment(1)})
+    assert wait_for(lambda: backend.online is False)
+    assert backend.pending_count == 1
+    assert backend.last_error
+    backend.sync_now()
+    assert wait_for(lambda: backend.pending_count == 0)
+    assert backend.online
+    assert remote.get("users/u/done") == 1
+
+
+def test_timed_out_replay_is_not_sent_again(tmp_path):
+    # The remote applies each write only after the client has given up waiting for it;
+    # re-sending the entry would count the increment twice.
+    remote = FlakyBackend(delay=0.3)
+    backend = offline_backend(tmp_path, remote, timeout=0.05)
+    assert wait_for(lambda: backend.online)
+    backend.update({"users/u/done": increment(1)})
+    assert wait_for(lambda: backend.pending_count == 0)
+    assert remote.get("users/u/done") == 1
+    assert remote.writes == 1
@@ -0,0 +1,96 @@
+import catalog
+from replica import TaskReplica
+from storage import MemoryBackend
+
+
+def task(subject, chapter, sn=("a",)):
+    return {"task": {"Subject": subject, "Chapter": chapter, "SN": list(sn)}, "check": {"SN": [False] * len(sn)}}
+
+
+def add(backend, key, subject, chapter="c"):
+    value = task(subject, chapter)
+    backend.update({f"tasks/{key}": value, **catalog.task_changes(value["task"], {}, 1)})
+
+
+def test_changes_since_lists_the_keys_each_version_touched():
+    replica = TaskReplica(MemoryBackend({"tasks": {"k1": task("A", "c1")}}), "tasks")
+    replica.snapshot()
+    start = replica.version
+    assert replica.changes_since(start) == (start, set())
+    replica.apply({"tasks/k2": task("A", "c2")})
+    replica.apply({"tasks/k1/task/Chapter": "renamed"})
+    version, keys = replica.changes_since(start)
+    assert version == start + 2
+    assert keys == {"k1", "k2"}
+    assert replica.changes_since(start + 1) == (version, {"k1"})
+    assert replica.values(["k1", "gone"]) == {"k1": {**task("A", "renamed")}, "gone": None}
+
+
+def test_changes_since_reports_unknown_after_a_full_replace():
+    replica = TaskReplica(MemoryBackend(), "tasks")
+    replica.snapshot()
+    start = replica.version
+    replica.apply({"tasks": {"k1": task("A", "c")}})
+    assert replica.changes_since(start)[1] is None
+
+
+def test_apply_ignores_paths_outside_the_copy():
+    replica = TaskReplica(MemoryBackend(), "users/u/tasks")
+    replica.snapshot()
+    start = replica.version
+    replica.apply({"users/other/tasks/k": task("A", "c"), "users/u/subjects/s_A/tasks": 1})
+    assert replica.version == start
+    replica.apply({"users/u/tasks/k": task("A", "c")})
+    assert replica.snapshot() == {"k": task("A", "c")}
+
+
+def test_refresh_without_changes_keeps_the_version():
+    backend = MemoryBackend({"tasks": {"k1": task("A", "c")}})
+    replica = TaskReplica(backend, "tasks", ttl=0)
+    replica.snapshot()
+    version = replica.version
+    replica.refresh()
+    assert replica.version == version
+    backend.set("tasks/k1/task/Chapter", "new")
+    replica.refresh()
+    assert replica.changes_since(version)[1] == {"k1"}
+
+
+def test_live_copy_follows_the_change_stream():
+    backend = MemoryBackend({"tasks": {"k1": task("A", "c")}})
+    replica = TaskReplica(backend, "tasks")
+    assert replica.start_listening()
+    version = replica.version
+    backend.set("tasks/k2", task("B", "d"))
+    assert replica.changes_since(version)[1] == {"k2"}
+    assert set(replica.snapshot()) == {"k1", "k2"}
+    replica.stop_listening()
+
+
+class CountingBackend(MemoryBackend):
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.queries = []
+
+    def query_equal(self, path, child, value):
+        self.queries.append(value)
+        return super().query_equal(path, child, value)
+
+
+def test_lazy_copy_requeries_only_subjects_whose_catalog_entry_moved():
+    backend = CountingBackend()
+    add(backend, "k1", "A")
+    add(backend, "k2", "B")
+    replica = TaskReplica(backend, "tasks", ttl=0, lazy_subjects=True)
+    assert set(replica.subject_snapshot("A")) == {"k1"}
+    replica.subject_snapshot("B")
+    assert replica.subjects() == {"A", "B"}
+    backend.queries.clear()
+    version = replica.version
+    replica.refresh()
+    assert backend.queries == []
+    assert replica.version == version
+    add(backend, "k3", "A")
+    replica.refresh()
+    assert backend.queries == ["A"]
+    assert replica.changes_since(version)[1] == {"k3"}
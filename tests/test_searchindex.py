@@ -0,0 +1,42 @@
+from searchindex import SearchIndex
+
+
+def make_index():
+    index = SearchIndex()
+    index.add("k1", {"Chapter": "Cardiac Cycle", "SN": ["Heart sounds", "ECG waves"], "LAQ": ["Cardiac output"]})
+    index.add("k2", {"Chapter": "Renal", "SN": ["GFR"], "LAQ": []})
+    return index
+
+
+def test_short_and_long_queries_match_substrings():
+    index = make_index()
+    assert index.search("ec") == {"k1": {"SN": [1]}}
+    assert index.search("cardiac") == {"k1": {"Chapter": [0], "LAQ": [0]}}
+    assert index.search("ardiac outp") == {"k1": {"LAQ": [0]}}
+    assert index.search("gfr") == {"k2": {"SN": [0]}}
+
+
+def test_search_is_case_insensitive_and_empty_query_matches_nothing():
+    index = make_index()
+    assert index.search("HEART") == index.search("heart") == {"k1": {"SN": [0]}}
+    assert index.search("") == {}
+    assert index.search("missing") == {}
+
+
+def test_prefix_search_matches_word_starts_only():
+    index = make_index()
+    assert index.search("wav", prefix=True) == {"k1": {"SN": [1]}}
+    assert index.search("ave", prefix=True) == {}
+    assert index.search("ave") == {"k1": {"SN": [1]}}
+
+
+def test_add_replaces_and_remove_forgets():
+    index = make_index()
+    index.add("k2", {"Chapter": "Kidney", "SN": [], "LAQ": []})
+    assert index.search("renal") == {}
+    assert index.search("kidney") == {"k2": {"Chapter": [0]}}
+    index.remove("k1")
+    assert index.search("heart") == {}
+    assert len(index) == 1
+    index.remove("unknown")
+    assert len(index) == 1
@@ -0,0 +1,84 @@
+import bitset
+import taskstore
+
+OLD_IDS = ["i0", "i1", "i2"]
+
+
+def test_diff_items_unchanged():
+    ids, sources, summary = taskstore.diff_items(["a", "b", "c"], OLD_IDS, ["a", "b", "c"])
+    assert ids == OLD_IDS
+    assert sources == [0, 1, 2]
+    assert summary == {"added": 0, "removed": 0, "renamed": 0, "moved": 0}
+
+
+def test_diff_items_reorder_keeps_ids():
+    ids, sources, summary = taskstore.diff_items(["a", "b", "c"], OLD_IDS, ["c", "a", "b"])
+    assert ids == ["i2", "i0", "i1"]
+    assert sources == [2, 0, 1]
+    assert summary == {"added": 0, "removed": 0, "renamed": 0, "moved": 1}
+
+
+def test_diff_items_duplicates_pair_up_in_order():
+    ids, sources, summary = taskstore.diff_items(["a", "a", "b"], OLD_IDS, ["a", "b", "a"])
+    assert sources == [0, 2, 1]
+    assert ids == ["i0", "i2", "i1"]
+    assert summary["added"] == summary["removed"] == 0
+
+
+def test_diff_items_rename_keeps_the_slot():
+    ids, sources, summary = taskstore.diff_items(["a", "b", "c"], OLD_IDS, ["a", "B", "c"])
+    assert ids == OLD_IDS
+    assert sources == [0, 1, 2]
+    assert summary == {"added": 0, "removed": 0, "renamed": 1, "moved": 0}
+
+
+def test_diff_items_removal():
+    ids, sources, summary = taskstore.diff_items(["a", "b", "c"], OLD_IDS, ["a", "c"])
+    assert ids == ["i0", "i2"]
+    assert sources == [0, 2]
+    assert summary == {"added": 0, "removed": 1, "renamed": 0, "moved": 0}
+
+
+def test_diff_items_addition_gets_a_fresh_id():
+    ids, sources, summary = taskstore.diff_items(["a", "b"], OLD_IDS[:2], ["a", "b", "new"])
+    assert sources == [0, 1, None]
+    assert ids[:2] == ["i0", "i1"] and ids[2] not in OLD_IDS
+    assert summary == {"added": 1, "removed": 0, "renamed": 0, "moved": 0}
+
+
+def test_item_ids_fall_back_to_positions():
+    assert taskstore.item_ids({"SN": ["a", "b"]}, "SN") == ["p0", "p1"]
+    assert taskstore.item_ids({"SN": ["a", "b"], "ItemIds": {"SN": ["x", "y"]}}, "SN") == ["x", "y"]
+    # IDs that no longer line up with the items are ignored.
+    assert taskstore.item_ids({"SN": ["a", "b"], "ItemIds": {"SN": ["x"]}}, "SN") == ["p0", "p1"]
+
+
+def test_edit_task_carries_ticks_with_their_items():
+    old_task = {"Subject": "S", "Chapter": "C", "SN": ["a", "b", "c"], "LAQ": ["x"]}
+    old_checks = {"SN": bitset.encode([True, True, False]), "LAQ": [True]}
+    task, checks, summary = taskstore.edit_task(old_task, old_checks, {**old_task, "SN": ["a", "B", "c", "d"]})
+    # "b" was renamed in place, so "B" keeps its ID and tick; "d" is new and unticked.
+    assert task["ItemIds"]["SN"][:3] == ["p0", "p1", "p2"]
+    assert bitset.decode(checks["SN"]) == [True, True, False, False]
+    assert bitset.decode(checks["LAQ"]) == [True]
+    assert summary["SN"] == {"added": 1, "removed": 0, "renamed": 1, "moved": 0}
+
+
+def test_edit_task_moves_ticks_on_reorder():
+    old_task = {"SN": ["a", "b", "c"], "LAQ": []}
+    old_checks = {"SN": bitset.encode([True, False, False])}
+    task, checks, _ = taskstore.edit_task(old_task, old_checks, {**old_task, "SN": ["c", "b", "a"]})
+    assert task["ItemIds"]["SN"] == ["p2", "p1", "p0"]
+    assert bitset.decode(checks["SN"]) == [False, False, True]
+
+
+def test_edit_changes_writes_only_changed_paths():
+    old_task = {"Chapter": "C", "SN": ["a", "b", "c"], "LAQ": []}
+    old_checks = {"SN": bitset.encode([True, False, False]), "LAQ": bitset.encode([])}
+    task = {**old_task, "SN": ["a", "B"]}
+    checks = {"SN": bitset.encode([True, False]), "LAQ": old_checks["LAQ"]}
+    assert taskstore.edit_changes(old_task, old_checks, task, checks) == {
+        "task/SN/1": "B",
+        "task/SN/2": None,
+        "check/SN": checks["SN"],
+    }
@@ -0,0 +1,128 @@
+import time
+
+import bitset
+import catalog
+from dbclient import DatabaseClient
+from fakes import FlakyBackend, wait_for
+from storage import MemoryBackend, increment
+from writeback import WriteBehindQueue
+
+CHECK = "tasks/k/check/SN"
+
+
+def tick_counters(done_delta):
+    return catalog.counter_changes("Anatomy", done=done_delta)
+
+
+def make_task(backend, states):
+    backend.set("tasks/k", {"task": {"Subject": "Anatomy", "SN": ["a"] * len(states)}, "check": {"SN": bitset.encode(states)}})
+
+
+def test_toggle_and_its_reverse_write_nothing():
+    backend = MemoryBackend({"x": 1})
+    queue = WriteBehindQueue(backend, delay=60)
+    queue.record("x", 2, previous=1)
+    queue.record("x", 1, previous=2)
+    queue.record_increment("n", 1)
+    queue.record_increment("n", -1)
+    assert queue.pending_count == 0
+    assert queue.flush()
+    assert backend.get("x") == 1 and backend.get("n") is None
+    assert queue.flushed_writes == 0
+
+
+def test_increments_are_summed_into_one_write():
+    backend = MemoryBackend({"n": 5})
+    queue = WriteBehindQueue(backend, delay=60)
+    for _ in range(3):
+        queue.record_increment("n", 1)
+    assert queue.pending_count == 1
+    assert queue.flush()
+    assert backend.get("n") == 8
+
+
+def test_tick_and_untick_cancel_out():
+    backend = MemoryBackend()
+    make_task(backend, [False, False])
+    queue = WriteBehindQueue(backend, delay=60)
+    queue.record_tick(CHECK, 0, True, previous=False, length=2, counters=tick_counters)
+    queue.record_tick(CHECK, 0, False, previous=True, length=2, counters=tick_counters)
+    assert queue.pending_count == 0
+    assert queue.flush()
+    assert backend.get("subjects") is None
+
+
+def test_ticks_from_two_sessions_are_merged():
+    # Each session only knows its own tick; the transaction keeps the other session's bit.
+    backend = MemoryBackend()
+    make_task(backend, [False, False, False])
+    first, second = WriteBehindQueue(backend, delay=60), WriteBehindQueue(backend, delay=60)
+    first.record_tick(CHECK, 0, True, previous=False, length=3, counters=tick_counters)
+    second.record_tick(CHECK, 2, True, previous=False, length=3, counters=tick_counters)
+    second.record_tick(CHECK, 0, True, previous=False, length=3, counters=tick_counters)
+    assert first.flush() and second.flush()
+    assert bitset.decode(backend.get(CHECK)) == [True, False, True]
+    # Item 0 was ticked by both, so it counts once.
+    assert backend.get("subjects/s_Anatomy/done") == 2
+
+
+def test_tick_on_a_deleted_task_does_not_recreate_it():
+    backend = MemoryBackend()
+    queue = WriteBehindQueue(backend, delay=60)
+    queue.record_tick(CHECK, 0, True, previous=False, length=1, counters=tick_counters)
+    assert queue.flush()
+    assert backend.get("tasks") is None and backend.get("subjects") is None
+
+
+def test_timed_out_write_is_settled_not_sent_again():
+    # The write outlives the timeout but still lands; sending it again would count it twice.
+    backend = FlakyBackend({"n": 0}, delay=0.3)
+    flushed = []
+    queue = WriteBehindQueue(DatabaseClient(backend, timeout=0.05), delay=60, timeout=0.05, on_flush=flushed.append)
+    queue.record_increment("n", 1)
+    assert not queue.flush()
+    assert queue.pending_count == 1  # in flight, not confirmed
+    assert queue.last_error
+    assert queue.flush()  # nothing left to send
+    assert wait_for(lambda: queue.pending_count == 0)
+    time.sleep(0.4)
+    assert backend.get("n") == 1
+    assert backend.writes == 1
+    assert queue.last_error is None
+    assert flushed == [{"n": increment(1)}]
+
+
+def test_timed_out_tick_moves_the_counter_once():
+    backend = FlakyBackend(delay=0.3)
+    make_task(backend, [False, False])
+    queue = WriteBehindQueue(DatabaseClient(backend, timeout=0.05), delay=0.05, timeout=0.05)
+    queue.record_tick(CHECK, 1, True, previous=False, length=2, counters=tick_counters)
+    assert not queue.flush()
+    # The counter change is queued once the transaction settles and goes out with the timer's flush.
+    assert wait_for(lambda: backend.get("subjects/s_Anatomy/done") == 1 and queue.pending_count == 0)
+    time.sleep(0.4)
+    assert bitset.decode(backend.get(CHECK)) == [False, True]
+    assert backend.get("subjects/s_Anatomy/done") == 1
+
+
+def test_failed_write_is_retried_with_backoff():
+    backend = FlakyBackend({"n": 0}, failures=3)
+    queue = WriteBehindQueue(backend, delay=0.05, max_delay=1)
+    queue.record_increment("n", 2)
+    assert wait_for(lambda: backend.get("n") == 2)
+    assert backend.get("n") == 2
+    assert queue.pending_count == 0 and queue.last_error is None
+    gaps = [after - before for before, after in zip(backend.attempts, backend.attempts[1:])]
+    # Waits of 0.1, 0.2 and 0.4 s after the first, second and third failure.
+    assert len(gaps) == 3
+    assert all(later > earlier for earlier, later in zip(gaps, gaps[1:]))
+
+
+def test_newer_toggle_wins_over_a_failed_write():
+    backend = FlakyBackend({"x": "old"}, failures=1)
+    queue = WriteBehindQueue(backend, delay=60)
+    queue.record("x", "first", previous="old")
+    assert not queue.flush()
+    queue.record("x", "second", previous="old")
+    assert queue.flush()
+    assert backend.get("x") == "second"
@@ -0,0 +1,216 @@
+"""Write-behind buffer for checkbox toggles.
+
+Toggles are recorded instantly and flushed to the storage backend after a
+short debounce, from a timer thread. A toggle followed by its reverse before
+the flush cancels out and writes nothing. Counter increments (see
+``catalog.py``) are summed the same way.
+
+A checkbox tick changes one bit of a list's encoded check string (see
+``bitset.py``), so it is not written as the session's copy of the string:
+that copy may be missing ticks made meanwhile in another session. Each list
+with pending ticks is instead rewritten with a ``transaction()`` that sets
+just those bits on the current value, and the done counter moves by the
+difference between the value it replaced and the value that won. Plain
+values and counters then go out together as one multi-path ``update()``.
+
+After a failed flush the timer is armed again, waiting twice as long after
+each consecutive failure (up to ``max_delay``), so queued toggles still
+reach the database once it recovers without hammering it meanwhile.
+
+Calls go through the backend's ``submit()``. One that outlives ``timeout``
+may still land, so it is not sent again: it is settled when it finishes,
+and only a call that actually failed is queued once more. Otherwise counter
+increments could be applied twice.
+"""
+import concurrent.futures
+import functools
+import threading
+import time
+
+import bitset
+from storage import increment, is_increment
+
+
+class WriteBehindQueue:
+    def __init__(self, backend, delay=1.0, on_flush=None, timeout=None, max_delay=60.0):
+        self._backend = backend
+        self._timeout = timeout  # seconds to wait for a write before leaving it to finish in the background
+        self._delay = delay
+        self._max_delay = max_delay
+        self._failures = 0  # consecutive failed flushes; stretches the retry delay
+        self._on_flush = on_flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # path -> (new value, value the database still holds)
+        self._increments = {}  # path -> summed counter delta
+        self._ticks = {}  # check path -> {"items": {index: (state, state in the database)}, "length": ..., "counters": ...}
+        self._timer = None
+        self.last_error = None
+        self.last_flush_at = None
+        self.flushed_writes = 0
+        self._in_flight = 0  # calls that outlived the timeout and have not finished yet
+
+    def record(self, path, value, previous):
+        """Queues ``path = value``; ``previous`` is what the database currently holds."""
+        with self._lock:
+            base = self._pending[path][1] if path in self._pending else previous
+            if value == base:
+                self._pending.pop(path, None)
+            else:
+                self._pending[path] = (value, base)
+            self._schedule()
+
+    def record_tick(self, path, index, state, previous, length, counters=None):
+        """Queues item ``index`` of the check string at ``path`` set to ``state``.
+
+        ``length`` is the list's item count; ``counters(done_delta)`` returns the
+        catalog updates for a change in ticked items.
+        """
+        with self._lock:
+            tick = self._ticks.setdefault(path, {"items": {}, "length": length, "counters": counters})
+            base = tick["items"][index][1] if index in tick["items"] else previous
+            if state == base:
+                tick["items"].pop(index, None)
+                if not tick["items"]:
+                    del self._ticks[path]
+            else:
+                tick["items"][index] = (state, base)
+            self._schedule()
+
+    def record_increment(self, path, delta):
+        with self._lock:
+            total = self._increments.get(path, 0) + delta
+            if total:
+                self._increments[path] = total
+            else:
+                self._increments.pop(path, None)
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._pending or self._increments or self._ticks:
+            delay = min(self._max_delay, self._delay * 2 ** min(self._failures, 16))
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+        else:
+            self._timer = None
+
+    def flush(self):
+        """Writes everything pending. Returns False if a write failed or is not confirmed yet."""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                ticks, self._ticks = self._ticks, {}
+            # Ticks first: the counter changes they produce go out with the update below.
+            calls = [(path, tick, *self._submit_ticks(path, tick)) for path, tick in ticks.items()]
+            ok = all([self._settle(future, functools.partial(self._ticks_done, path, tick, replaced)) for path, tick, future, replaced in calls])
+            with self._lock:
+                batch, increments = self._pending, self._increments
+                self._pending, self._increments = {}, {}
+            if batch or increments:
+                values = {path: value for path, (value, _) in batch.items()}
+                values.update({path: increment(delta) for path, delta in increments.items()})
+                future = self._backend.submit("update", values)
+                ok = self._settle(future, functools.partial(self._update_done, batch, increments, values)) and ok
+            with self._lock:
+                if ok and not self._in_flight:
+                    self.last_error = None
+            return ok
+
+    def _settle(self, future, done):
+        """Waits for a submitted call and hands it to ``done``; False if it failed or is still running."""
+        try:
+            future.exception(timeout=self._timeout)
+        except concurrent.futures.TimeoutError:
+            # The call may still land, so it is never sent again: it is settled whenever it finishes.
+            with self._lock:
+                self._in_flight += 1
+                self.last_error = "The database has not confirmed some changes yet."
+            future.add_done_callback(functools.partial(self._settle_late, done))
+            return False
+        return done(future)
+
+    def _settle_late(self, done, future):
+        ok = done(future)
+        with self._lock:
+            self._in_flight -= 1
+            if ok and not self._in_flight and not self._pending and not self._increments and not self._ticks:
+                self.last_error = None
+
+    def _submit_ticks(self, path, tick):
+        """Starts the transaction setting the ticked bits; returns its future and a dict that gets the replaced value."""
+        states = {index: state for index, (state, _) in tick["items"].items()}
+        replaced = {}
+        def update(current):
+            replaced["value"] = current
+            if current is None:
+                return None  # The task was deleted meanwhile; do not recreate its check node.
+            for index, state in states.items():
+                current = bitset.with_state(current, index, state, tick["length"])
+            return current
+        return self._backend.submit("transaction", path, update), replaced
+
+    def _ticks_done(self, path, tick, replaced, future):
+        try:
+            new = future.result()
+        except Exception as e:
+            with self._lock:
+                pending = self._ticks.setdefault(path, {**tick, "items": {}})
+                for index, entry in tick["items"].items():
+                    pending["items"].setdefault(index, entry)
+            self._failed(e)
+            return False
+        old = replaced.get("value")
+        if old is not None and tick["counters"] is not None:
+            self._queue_changes(tick["counters"](bitset.count(new) - bitset.count(old)))
+        self._written({path: new})
+        return True
+
+    def _update_done(self, batch, increments, values, future):
+        try:
+            future.result()
+        except Exception as e:
+            with self._lock:
+                # Keep failed writes unless a newer toggle already replaced them.
+                for path, entry in batch.items():
+                    self._pending.setdefault(path, entry)
+                for path, delta in increments.items():
+                    self._increments[path] = self._increments.get(path, 0) + delta
+            self._failed(e)
+            return False
+        self._written(values)
+        return True
+
+    def _queue_changes(self, changes):
+        # Counter updates derived from a finished transaction; they go out with the next update.
+        with self._lock:
+            for path, value in changes.items():
+                if is_increment(value):
+                    self._increments[path] = self._increments.get(path, 0) + value[".sv"]["increment"]
+                else:
+                    self._pending[path] = (value, None)
+            self._schedule()
+
+    def _written(self, values):
+        with self._lock:
+            self._failures = 0
+            self.last_flush_at = time.time()
+            self.flushed_writes += len(values)
+        if self._on_flush is not None:
+            self._on_flush(values)
+
+    def _failed(self, error):
+        # Failed writes are back in the queue by now; retry them later.
+        with self._lock:
+            self.last_error = str(error)
+            self._failures += 1
+            self._schedule()
+
+    @property
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending) + len(self._increments) + sum(len(tick["items"]) for tick in self._ticks.values()) + self._in_flight